@@ -36,6 +36,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # serve static files in production
     'corsheaders.middleware.CorsMiddleware',
+    'tickets.admission.AdmissionControlMiddleware',  # render load can't starve validation
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,18 +75,96 @@ DATABASES = {
     }
 }
 
-# MongoDB Configuration using mongoengine
-import mongoengine
-
+# MongoDB Configuration
 MONGODB_URI = os.getenv('MONGODB_URI')
 MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'ticket_db')
 
-# Connect to MongoDB
-mongoengine.connect(
-    db=MONGODB_DB_NAME,
-    host=MONGODB_URI,
-    alias='default'
-)
+# Fast cold start (free-tier instances sleep): don't connect at import time –
+# tickets/mongodb_utils.py opens the pymongo client on first use – and let
+# views load the ticket rendering stack on demand. With FAST_COLD_START=False
+# everything is connected and imported at boot instead (see wsgi.py).
+FAST_COLD_START = os.getenv('FAST_COLD_START', 'True') == 'True'
+
+if not FAST_COLD_START:
+    # Skipped in fast mode: mongoengine (which also pulls in Pillow) is only
+    # needed for Document models; the tickets app talks to MongoDB via pymongo.
+    import mongoengine
+
+    # Connect to MongoDB
+    mongoengine.connect(
+        db=MONGODB_DB_NAME,
+        host=MONGODB_URI,
+        alias='default'
+    )
+
+# Event that tickets created without an event_id (including every ticket
+# generated before events existed) belong to
+DEFAULT_EVENT_ID = os.getenv('DEFAULT_EVENT_ID', 'default')
+
+# Ticket ID format for new tickets: 'uuid' (36 chars) or 'compact'
+# (24-char base32, smaller QR codes). Existing tickets validate either way.
+TICKET_ID_FORMAT = os.getenv('TICKET_ID_FORMAT', 'uuid')
+# QR error correction level: L, M, Q or H
+TICKET_QR_ERROR_CORRECTION = os.getenv('TICKET_QR_ERROR_CORRECTION', 'H')
+
+# Ticket image encodings (tickets/rendering.py ENCODING_PROFILES); requests
+# can override these with an "encoding" field / ?encoding= parameter
+TICKET_PREVIEW_ENCODING = os.getenv('TICKET_PREVIEW_ENCODING', 'png')    # api_generate
+TICKET_DOWNLOAD_ENCODING = os.getenv('TICKET_DOWNLOAD_ENCODING', 'png')  # ZIP downloads, jobs
+
+# Rendered design previews kept in memory per process (tickets/previews.py)
+DESIGN_PREVIEW_CACHE_SIZE = int(os.getenv('DESIGN_PREVIEW_CACHE_SIZE', '128'))
+
+# Ticket archival (tickets/archive.py, manage.py archive_tickets): default age
+# for moving batches out of the hot collection, and tickets moved per round trip
+TICKET_ARCHIVE_AFTER_DAYS = int(os.getenv('TICKET_ARCHIVE_AFTER_DAYS', '180'))
+TICKET_ARCHIVE_BATCH_SIZE = int(os.getenv('TICKET_ARCHIVE_BATCH_SIZE', '1000'))
+
+# Warm pool of pre-rendered tickets (tickets/warm_pool.py), refilled from the
+# keep-alive cron ping for the most recently used designs
+WARM_POOL_ENABLED = os.getenv('WARM_POOL_ENABLED', 'False') == 'True'
+WARM_POOL_SIZE = int(os.getenv('WARM_POOL_SIZE', '50'))              # tickets per design
+WARM_POOL_MAX_DESIGNS = int(os.getenv('WARM_POOL_MAX_DESIGNS', '5'))
+WARM_POOL_DESIGN_TTL_HOURS = float(os.getenv('WARM_POOL_DESIGN_TTL_HOURS', '72'))
+WARM_POOL_FILL_SECONDS = float(os.getenv('WARM_POOL_FILL_SECONDS', '20'))  # render budget per refill
+# Skip a refill unless no render or validate request has run for this long
+WARM_POOL_IDLE_SECONDS = float(os.getenv('WARM_POOL_IDLE_SECONDS', '30'))
+
+# Idempotency-Key handling for api_generate / api_download_tickets
+# (tickets/idempotency.py): how long results are replayable, how long a
+# duplicate waits for the original, and when an unfinished claim is abandoned
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '30'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '300'))
+
+# Background ticket generation jobs (tickets/jobs.py)
+TICKET_JOB_WORKERS = int(os.getenv('TICKET_JOB_WORKERS', '2'))
+TICKET_JOB_MAX_COUNT = int(os.getenv('TICKET_JOB_MAX_COUNT', '5000'))
+# A running job whose worker hasn't reported progress for this long is
+# considered abandoned and is picked up again by the next status poll.
+TICKET_JOB_STALE_SECONDS = int(os.getenv('TICKET_JOB_STALE_SECONDS', '120'))
+# Finished jobs' ZIPs are kept this long in GridFS (manage.py purge_expired_files)
+TICKET_JOB_RESULT_TTL_HOURS = float(os.getenv('TICKET_JOB_RESULT_TTL_HOURS', '24'))
+
+# Scan event log (tickets/scan_log.py): buffered writes off the request path
+SCAN_LOG_ENABLED = os.getenv('SCAN_LOG_ENABLED', 'True') == 'True'
+SCAN_LOG_FLUSH_SECONDS = float(os.getenv('SCAN_LOG_FLUSH_SECONDS', '2'))
+SCAN_LOG_BATCH_SIZE = int(os.getenv('SCAN_LOG_BATCH_SIZE', '500'))
+SCAN_LOG_MAX_BUFFER = int(os.getenv('SCAN_LOG_MAX_BUFFER', '10000'))
+SCAN_LOG_CAPPED_MB = int(os.getenv('SCAN_LOG_CAPPED_MB', '64'))
+# Per-gate, per-minute rollups are deleted by a TTL index after this many days
+SCAN_ROLLUP_TTL_DAYS = float(os.getenv('SCAN_ROLLUP_TTL_DAYS', '30'))
+
+# Admission control (tickets/admission.py): per-process limits on rendering
+# endpoints so gate validation always gets a thread. Running plus queued
+# renders must stay below WEB_THREADS (gunicorn --threads, see render.yaml);
+# the middleware refuses to start otherwise.
+WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True') == 'True'
+ADMISSION_RENDER_CONCURRENCY = int(os.getenv('ADMISSION_RENDER_CONCURRENCY', '2'))
+ADMISSION_RENDER_QUEUE = int(os.getenv('ADMISSION_RENDER_QUEUE', '1'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
 
 # CORS Configuration
 _cors_origins_env = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000')
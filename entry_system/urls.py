@@ -24,6 +24,9 @@ from tickets import views
 
 def cron_ping(request):
     """Keep-alive endpoint for FastCron — returns 200 OK so Render stays warm."""
+    # Idle time: top up the warm pool in the background (no-op when disabled)
+    from tickets.warm_pool import schedule_refill
+    schedule_refill()
     return JsonResponse({'status': 'ok'})
 
 urlpatterns = [
@@ -41,17 +44,26 @@ urlpatterns = [
     path('save-design/', views.save_design, name='save_design'),
     path('generate/', views.generate_tickets, name='generate'),
     path('download-tickets/', views.download_tickets_zip, name='download_tickets'),
+    path('download-tickets/print/', views.download_tickets_pdf, name='download_tickets_pdf'),
     path('scanner/', views.gate_scanner, name='scanner'),
     path('api/validate/', views.validate_ticket_api, name='validate'),
+    path('api/gates/throughput/', views.api_gate_throughput, name='api_gate_throughput'),
 
     # ── JSON API – consumed by the Next.js frontend ──────────────────────
     path('api/login/', views.api_login, name='api_login'),
     path('api/register/', views.api_register, name='api_register'),
     path('api/logout/', views.api_logout, name='api_logout'),
     path('api/dashboard/', views.api_dashboard, name='api_dashboard'),
+    path('api/stats/groups/', views.api_group_stats, name='api_group_stats'),
     path('api/save-design/', views.api_save_design, name='api_save_design'),
+    path('api/design/preview/', views.api_design_preview, name='api_design_preview'),
     path('api/generate/', views.api_generate, name='api_generate'),
     path('api/download-tickets/', views.api_download_tickets, name='api_download_tickets'),
+    path('api/jobs/', views.api_generate_job, name='api_generate_job'),
+    path('api/jobs/<str:job_id>/', views.api_job_status, name='api_job_status'),
+    path('api/jobs/<str:job_id>/download/', views.api_job_download, name='api_job_download'),
+    path('api/admission/stats/', views.api_admission_stats, name='api_admission_stats'),
+    path('api/pool/stats/', views.api_warm_pool_stats, name='api_warm_pool_stats'),
     # ── Cron / keep-alive ──────────────────────────────────────────────────
     path('api/cron/ping/', cron_ping, name='cron_ping'),
 ]
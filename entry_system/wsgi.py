@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'entry_system.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if not settings.FAST_COLD_START:
+    # Pay for everything at boot rather than on the first requests
+    import tickets.rendering  # noqa: F401
+    from tickets.mongodb_utils import get_mongo_client
+    get_mongo_client()
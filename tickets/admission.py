@@ -0,0 +1,210 @@
+"""
+Admission control: keeps heavy rendering requests from starving gate validation.
+
+Requests are classified by URL name:
+
+    validate  always admitted straight away (never queued or shed)
+    render    at most ADMISSION_RENDER_CONCURRENCY at once per process; up to
+              ADMISSION_RENDER_QUEUE more wait (for ADMISSION_QUEUE_TIMEOUT
+              seconds) and anything beyond that gets 429 with Retry-After
+    other     passed through untouched
+
+The limits are per process and so are gunicorn's threads (--worker-class
+gthread --threads WEB_THREADS, see render.yaml). A queued request still holds
+its thread while it waits, so running plus queued renders must be fewer than
+WEB_THREADS for validation to always find a free one; the middleware refuses
+to start otherwise. Set ADMISSION_RENDER_QUEUE=0 to shed instead of queueing.
+
+Background generation jobs and warm-pool refills render in the same process,
+so they take render slots too, one ticket at a time, with try_acquire(): they
+only use a slot nobody is waiting for, and never queue or hold a gunicorn
+thread.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+VALIDATE_VIEWS = {'validate'}
+
+RENDER_VIEWS = {
+    'generate',
+    'download_tickets',
+    'download_tickets_pdf',
+    'api_generate',
+    'api_download_tickets',
+    'api_design_preview',
+}
+
+
+class AdmissionClass:
+    """Concurrency limit with a bounded wait queue and counters."""
+
+    def __init__(self, name, limit=None, queue_size=0, timeout=0):
+        self.name = name
+        self.limit = limit          # None = unlimited
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.last_active = None     # time.monotonic() of the last acquire/release
+        self._cond = threading.Condition()
+
+    def _has_room(self):
+        return self.limit is None or self.active < self.limit
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed. Returns False if shed."""
+        with self._cond:
+            if not self._has_room():
+                if self.waiting >= self.queue_size:
+                    self.shed += 1
+                    return False
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(self._has_room, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.shed += 1
+                    return False
+            self.active += 1
+            self.admitted += 1
+            self.last_active = time.monotonic()
+            return True
+
+    def try_acquire(self):
+        """Take a free slot without queueing (and without jumping the queue); False if none."""
+        with self._cond:
+            if self.waiting or not self._has_room():
+                return False
+            self.active += 1
+            self.admitted += 1
+            self.last_active = time.monotonic()
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self.last_active = time.monotonic()
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit':      self.limit,
+                'active':     self.active,
+                'queued':     self.waiting,
+                'queue_size': self.queue_size,
+                'admitted':   self.admitted,
+                'shed':       self.shed,
+            }
+
+
+CLASSES = {
+    'validate': AdmissionClass('validate'),
+    'render': AdmissionClass(
+        'render',
+        limit=settings.ADMISSION_RENDER_CONCURRENCY,
+        queue_size=settings.ADMISSION_RENDER_QUEUE,
+        timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    ),
+}
+
+
+def classify(path):
+    """Admission class name for a request path, or None if it isn't controlled."""
+    try:
+        url_name = resolve(path).url_name
+    except Resolver404:
+        return None
+    if url_name in VALIDATE_VIEWS:
+        return 'validate'
+    if url_name in RENDER_VIEWS:
+        return 'render'
+    return None
+
+
+def admission_stats():
+    return {name: cls.stats() for name, cls in CLASSES.items()}
+
+
+def is_idle(seconds):
+    """True if no render or validate request is running or has run in the last `seconds`."""
+    now = time.monotonic()
+    return all(
+        cls.active == 0 and cls.waiting == 0
+        and (cls.last_active is None or now - cls.last_active >= seconds)
+        for cls in CLASSES.values()
+    )
+
+
+class _ReleaseOnClose:
+    """
+    Wraps streaming content so the slot is held until the response is closed
+    (Django calls close() once the last chunk is sent or the client goes away).
+    """
+
+    def __init__(self, content, release):
+        self.content = content
+        self._release = release
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        if hasattr(self.content, 'close'):
+            self.content.close()
+        if self._release:
+            self._release()
+            self._release = None
+
+
+def check_thread_budget():
+    """Raise ImproperlyConfigured if running plus queued renders could take every thread."""
+    render = CLASSES['render']
+    if render.limit + render.queue_size >= settings.WEB_THREADS:
+        raise ImproperlyConfigured(
+            f'ADMISSION_RENDER_CONCURRENCY ({render.limit}) + ADMISSION_RENDER_QUEUE '
+            f'({render.queue_size}) must be less than WEB_THREADS ({settings.WEB_THREADS}), '
+            'otherwise queued renders can leave no thread for validation'
+        )
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.ADMISSION_CONTROL_ENABLED:
+            check_thread_budget()
+
+    def __call__(self, request):
+        name = classify(request.path_info) if settings.ADMISSION_CONTROL_ENABLED else None
+        if name is None:
+            return self.get_response(request)
+
+        cls = CLASSES[name]
+        if not cls.acquire():
+            response = JsonResponse(
+                {'status': 'error', 'message': 'Server busy, please retry shortly.'},
+                status=429,
+            )
+            response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            cls.release()
+            raise
+
+        if response.streaming:
+            response.streaming_content = _ReleaseOnClose(response.streaming_content, cls.release)
+        else:
+            cls.release()
+        return response
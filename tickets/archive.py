@@ -0,0 +1,229 @@
+"""
+Hot/cold archival of tickets.
+
+Tickets of finished events (or batches older than TICKET_ARCHIVE_AFTER_DAYS)
+are moved out of the hot `tickets` collection in bulk, either into the
+`tickets_archive` collection or appended to a gzip-compressed NDJSON file.
+Validation and stats then only touch live events' tickets and indexes.
+
+Every move folds the moved tickets into `archived_stats` (one summary per
+event and batch), so totals still include archived tickets without reading
+them. Restoring moves tickets back and takes them out of the summaries.
+
+Documents are copied before they are deleted, so an interrupted run leaves
+tickets in both places (the next run finishes the move), never in neither.
+"""
+
+import gzip
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .mongodb_utils import (
+    DUPLICATE_KEY, get_tickets_collection, get_archive_collection, get_archived_stats_collection, event_filter,
+    bump_ticket_change_seq,
+)
+
+DATETIME_FIELDS = ('scanned_at', 'created_at')
+
+_indexes_ready = False
+
+
+def _ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    archive = get_archive_collection()
+    archive.create_index([('event_id', ASCENDING), ('batch_id', ASCENDING)])
+    archive.create_index([('ticket_id', ASCENDING)])
+    get_archived_stats_collection().create_index(
+        [('event_id', ASCENDING), ('batch_id', ASCENDING)], unique=True,
+    )
+    _indexes_ready = True
+
+
+def archive_query(event_id=None, older_than_days=None, batch_id=None):
+    """
+    Query for the tickets to archive: one event (optionally one batch of it),
+    and/or tickets created more than `older_than_days` days ago.
+    """
+    query = event_filter(event_id) if event_id else {}
+    if batch_id:
+        query['batch_id'] = batch_id
+    if older_than_days is not None:
+        query['created_at'] = {'$lt': datetime.utcnow() - timedelta(days=older_than_days)}
+    if not query:
+        raise ValueError('Refusing to archive every ticket: pass an event, batch or age')
+    return query
+
+
+def _summary_key(doc):
+    return doc.get('event_id') or settings.DEFAULT_EVENT_ID, doc.get('batch_id'), doc.get('created_by')
+
+
+def _update_summaries(docs, sign, location):
+    """Add (sign=1) or remove (sign=-1) docs from the per-event/batch summaries."""
+    totals, used = Counter(), Counter()
+    for doc in docs:
+        key = _summary_key(doc)
+        totals[key] += 1
+        if doc.get('is_used'):
+            used[key] += 1
+    if not totals:
+        return
+
+    now = datetime.utcnow()
+    operations = []
+    for (event_id, batch_id, created_by), count in totals.items():
+        operations.append(UpdateOne(
+            {'event_id': event_id, 'batch_id': batch_id},
+            {
+                '$inc': {'total': sign * count, 'used': sign * used[(event_id, batch_id, created_by)]},
+                '$set': {'created_by': created_by, 'updated_at': now},
+                **({'$addToSet': {'locations': location}} if sign > 0 else {}),
+            },
+            upsert=True,
+        ))
+    get_archived_stats_collection().bulk_write(operations, ordered=False)
+    # Fully restored groups leave no summary behind
+    get_archived_stats_collection().delete_many({'total': {'$lte': 0}})
+    bump_ticket_change_seq({event_id for event_id, _, _ in totals})
+
+
+def _to_json(doc):
+    doc = {k: v for k, v in doc.items() if k != '_id'}
+    for field in DATETIME_FIELDS:
+        if doc.get(field):
+            doc[field] = doc[field].isoformat()
+    return json.dumps(doc)
+
+
+def _from_json(line):
+    doc = json.loads(line)
+    for field in DATETIME_FIELDS:
+        if doc.get(field):
+            doc[field] = datetime.fromisoformat(doc[field])
+    return doc
+
+
+def _insert_ignoring_duplicates(collection, docs):
+    """insert_many that treats already-copied documents (from an interrupted run) as done."""
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        if any(err['code'] != DUPLICATE_KEY for err in exc.details['writeErrors']):
+            raise
+
+
+def archive_tickets(query, path=None, batch_size=None):
+    """
+    Move the tickets matching `query` out of the hot collection, into the
+    archive collection or (with `path`) appended to a gzip NDJSON file.
+    Returns the number of tickets moved.
+    """
+    _ensure_indexes()
+    batch_size = batch_size or settings.TICKET_ARCHIVE_BATCH_SIZE
+    tickets = get_tickets_collection()
+    location = f'file:{path}' if path else 'collection'
+    out = gzip.open(path, 'at', encoding='utf-8') if path else None
+    moved = 0
+    try:
+        while True:
+            docs = list(tickets.find(query).limit(batch_size))
+            if not docs:
+                break
+            if out:
+                out.writelines(_to_json(doc) + '\n' for doc in docs)
+                out.flush()
+            else:
+                _insert_ignoring_duplicates(get_archive_collection(), docs)
+            tickets.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+            _update_summaries(docs, 1, location)
+            moved += len(docs)
+    finally:
+        if out:
+            out.close()
+    return moved
+
+
+def restore_tickets(event_id=None, batch_id=None, path=None, batch_size=None):
+    """
+    Move archived tickets back into the hot collection: one event (or batch)
+    from the archive collection, or everything in a gzip NDJSON archive file.
+    Returns the number of tickets restored.
+    """
+    _ensure_indexes()
+    batch_size = batch_size or settings.TICKET_ARCHIVE_BATCH_SIZE
+    if path:
+        return _restore_from_file(path, batch_size)
+
+    query = archive_query(event_id, batch_id=batch_id)
+    archive = get_archive_collection()
+    restored = 0
+    while True:
+        docs = list(archive.find(query).limit(batch_size))
+        if not docs:
+            break
+        _insert_ignoring_duplicates(get_tickets_collection(), docs)
+        archive.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+        _update_summaries(docs, -1, None)
+        restored += len(docs)
+    return restored
+
+
+def _restore_from_file(path, batch_size):
+    tickets = get_tickets_collection()
+    restored = 0
+
+    def flush(docs):
+        # Upserts keyed by ticket ID, so restoring a file twice is harmless;
+        # only newly inserted tickets are taken out of the summaries
+        operations = [
+            UpdateOne({'ticket_id': doc['ticket_id']}, {'$setOnInsert': doc}, upsert=True)
+            for doc in docs
+        ]
+        try:
+            upserted = tickets.bulk_write(operations, ordered=False).upserted_ids
+        except BulkWriteError as exc:
+            # A concurrent writer inserted some of them first (unique index)
+            if any(err['code'] != DUPLICATE_KEY for err in exc.details['writeErrors']):
+                raise
+            upserted = {item['index']: item['_id'] for item in exc.details.get('upserted', [])}
+        inserted = [docs[i] for i in upserted]
+        _update_summaries(inserted, -1, None)
+        return len(inserted)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        docs = []
+        for line in f:
+            if line.strip():
+                docs.append(_from_json(line))
+            if len(docs) >= batch_size:
+                restored += flush(docs)
+                docs = []
+        if docs:
+            restored += flush(docs)
+    return restored
+
+
+def archived_stats(event_id=None):
+    """Totals of archived tickets ({'total', 'used'}) for one event or all events."""
+    query = {'event_id': event_id} if event_id else {}
+    total = used = 0
+    for doc in get_archived_stats_collection().find(query, {'total': 1, 'used': 1}):
+        total += doc.get('total', 0)
+        used += doc.get('used', 0)
+    return {'total': total, 'used': used}
+
+
+def archived_summaries(event_id=None):
+    """Per-event/batch archive summaries, newest first."""
+    query = {'event_id': event_id} if event_id else {}
+    return [
+        {**doc, 'updated_at': doc['updated_at'].isoformat()}
+        for doc in get_archived_stats_collection().find(query, {'_id': 0}).sort('updated_at', -1)
+    ]
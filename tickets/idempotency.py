@@ -0,0 +1,332 @@
+"""
+Idempotency-Key support for expensive POST endpoints.
+
+A client that retries a slow request (proxy timeout, double click) sends the
+same `Idempotency-Key` header again. The first request with a key claims it
+in the `idempotency_keys` collection and runs the view; its successful
+response is stored in GridFS for IDEMPOTENCY_TTL_SECONDS. Retries get the
+stored response replayed (streamed from GridFS, with `Idempotent-Replayed:
+true`) instead of rendering and inserting a new batch. A retry that arrives
+while the original is still running waits for it (up to
+IDEMPOTENCY_WAIT_SECONDS, then 409 with Retry-After).
+
+Expired records are removed by a TTL index; their stored bodies are deleted
+by `manage.py purge_expired_files`, never on the request path.
+
+Error responses and interrupted streams aren't stored. A view can record its
+progress while it runs (record_batch / record_tickets – api_generate's batch id
+and each ticket as it is inserted); the record is then kept as `partial` and
+the retry resumes it (resumed_batch) instead of creating a second batch.
+Without progress the key is released, so a retry runs again from scratch.
+Reusing a key with a different request body is rejected with 422.
+
+Keys are scoped to the caller – the logged-in user, else the session, else
+the `created_by` the cross-origin client sends, else the client address – and
+must be at least MIN_KEY_LENGTH characters (a UUID, not a counter), so two
+callers don't end up sharing a key and seeing each other's responses.
+"""
+
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .mongodb_utils import get_gridfs_bucket, get_idempotency_collection
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+# Keys must be random enough not to collide between callers that share a
+# scope (e.g. cross-origin clients behind one proxy address): a UUID is 36
+MIN_KEY_LENGTH = 16
+
+# How often a waiting duplicate re-reads a record owned by another process
+POLL_SECONDS = 0.25
+
+REPLAY_CHUNK_SIZE = 64 * 1024
+
+# Records owned by this process: duplicates here wake up as soon as it finishes
+_local_done = {}
+_indexes_ready = False
+
+
+def _ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # TTL index: MongoDB deletes records once expires_at has passed
+    get_idempotency_collection().create_index('expires_at', expireAfterSeconds=0)
+    _indexes_ready = True
+
+
+def _claim(record_id, fingerprint):
+    """
+    Try to own `record_id`. Returns (True, record to resume or None) if this
+    request should run the view, otherwise (False, existing record or None if
+    it just disappeared).
+    """
+    from pymongo.errors import DuplicateKeyError
+
+    _ensure_indexes()
+    records = get_idempotency_collection()
+    now = datetime.utcnow()
+    locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    fresh = {
+        'fingerprint':  fingerprint,
+        'status':       'in_progress',
+        'file_id':      None,
+        'batch_id':     None,
+        'ticket_ids':   [],
+        'locked_until': locked_until,
+        'expires_at':   now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        'created_at':   now,
+    }
+    try:
+        records.insert_one({'_id': record_id, **fresh})
+        return True, None
+    except DuplicateKeyError:
+        pass
+
+    # A record that has expired but not been removed by the TTL monitor yet
+    # starts over
+    if records.find_one_and_update({'_id': record_id, 'expires_at': {'$lt': now}}, {'$set': fresh}):
+        return True, None
+
+    # Resume a record whose owner was interrupted, or died mid-request,
+    # keeping the progress it recorded
+    taken = records.find_one_and_update(
+        {'_id': record_id, 'fingerprint': fingerprint, '$or': [
+            {'status': 'partial'},
+            {'status': 'in_progress', 'locked_until': {'$lt': now}},
+        ]},
+        {'$set': {'status': 'in_progress', 'locked_until': locked_until}},
+    )
+    if taken:
+        return True, taken
+    return False, records.find_one({'_id': record_id})
+
+
+def _release(record_id):
+    """
+    Unlock an unfinished record so the next retry runs the view again: kept
+    as `partial` if the view recorded tickets to resume from, else forgotten.
+    """
+    records = get_idempotency_collection()
+    records.update_one(
+        {'_id': record_id, 'status': 'in_progress', 'ticket_ids.0': {'$exists': True}},
+        {'$set': {'status': 'partial'}},
+    )
+    records.delete_one({'_id': record_id, 'status': 'in_progress'})
+
+
+def resumed_batch(request):
+    """
+    (batch_id, ticket_ids) recorded by an interrupted earlier run with this
+    request's Idempotency-Key, or (None, []) when starting afresh.
+    """
+    record = getattr(request, 'idempotency_resumed', None) or {}
+    return record.get('batch_id'), list(record.get('ticket_ids') or [])
+
+
+def record_batch(request, batch_id):
+    """Remember the batch this keyed request is creating (no-op without a key)."""
+    record_id = getattr(request, 'idempotency_record_id', None)
+    if record_id:
+        get_idempotency_collection().update_one({'_id': record_id}, {'$set': {'batch_id': batch_id}})
+
+
+def record_tickets(request, ticket_ids):
+    """Remember tickets this keyed request has inserted (no-op without a key)."""
+    record_id = getattr(request, 'idempotency_record_id', None)
+    if record_id and ticket_ids:
+        get_idempotency_collection().update_one(
+            {'_id': record_id}, {'$push': {'ticket_ids': {'$each': list(ticket_ids)}}},
+        )
+
+
+def _store(record_id, response, fileobj):
+    """Save a finished response body to GridFS and mark the record done."""
+    expires_at = datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    file_id = get_gridfs_bucket().upload_from_stream(
+        f'idempotency_{record_id}', fileobj,
+        metadata={'idempotency_key': record_id, 'expires_at': expires_at},
+    )
+    get_idempotency_collection().update_one(
+        {'_id': record_id},
+        {'$set': {
+            'status':              'done',
+            'file_id':             file_id,
+            'status_code':         response.status_code,
+            'content_type':        response['Content-Type'],
+            'content_disposition': response.get('Content-Disposition'),
+            'expires_at':          expires_at,
+            'finished_at':         datetime.utcnow(),
+        }},
+    )
+
+
+def _recorded_stream(record_id, response, content, finish):
+    """Pass streaming chunks through while spooling them; store once complete."""
+    complete = False
+    with tempfile.TemporaryFile() as spool:
+        try:
+            for chunk in content:
+                spool.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            # A client that disconnects mid-stream gets its retry resumed (or rerun)
+            try:
+                if complete:
+                    spool.seek(0)
+                    _store(record_id, response, spool)
+                else:
+                    _release(record_id)
+            except Exception:
+                logger.exception('Failed to record idempotent response %s', record_id)
+                _release(record_id)
+            finish()
+
+
+def _replay(record):
+    grid_out = get_gridfs_bucket().open_download_stream(record['file_id'])
+    response = StreamingHttpResponse(
+        iter(lambda: grid_out.read(REPLAY_CHUNK_SIZE), b''),
+        content_type=record['content_type'],
+        status=record['status_code'],
+    )
+    response['Content-Length'] = str(grid_out.length)
+    if record.get('content_disposition'):
+        response['Content-Disposition'] = record['content_disposition']
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _run_and_record(record_id, view, request, args, kwargs):
+    done = threading.Event()
+    _local_done[record_id] = done
+
+    def finish():
+        _local_done.pop(record_id, None)
+        done.set()
+
+    try:
+        response = view(request, *args, **kwargs)
+    except BaseException:
+        _release(record_id)
+        finish()
+        raise
+
+    if not 200 <= response.status_code < 300:
+        _release(record_id)
+        finish()
+        return response
+
+    if response.streaming:
+        response.streaming_content = _recorded_stream(
+            record_id, response, response.streaming_content, finish,
+        )
+        return response
+
+    try:
+        _store(record_id, response, BytesIO(response.content))
+    except Exception:
+        logger.exception('Failed to record idempotent response %s', record_id)
+        _release(record_id)
+    finish()
+    return response
+
+
+def _wait(record_id, timeout):
+    done = _local_done.get(record_id)
+    if done:
+        done.wait(timeout)
+    else:
+        time.sleep(min(POLL_SECONDS, timeout))
+
+
+def _body_creator(request):
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return None
+    return body.get('created_by') if isinstance(body, dict) else None
+
+
+def _scope(request):
+    """
+    Who the key belongs to: the logged-in user, else the session, else the
+    organiser the (sessionless, cross-origin) Next.js client names, else the
+    client address – which on Render is the proxy's, shared by every caller.
+    """
+    user_id = request.session.get('user_id')
+    creator = _body_creator(request)
+    if user_id:
+        scope = f'user:{user_id}'
+    elif request.session.session_key:
+        scope = f'session:{request.session.session_key}'
+    elif creator:
+        scope = f'creator:{creator}'
+    else:
+        scope = f'addr:{request.META.get("REMOTE_ADDR", "")}'
+    return hashlib.sha256(scope.encode()).hexdigest()[:16]
+
+
+def idempotent(view):
+    """
+    Honour an `Idempotency-Key` request header on `view` (see module docstring).
+    Requests without the header are passed straight through.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'status': 'error', 'message': 'Idempotency-Key is too long'}, status=400)
+        if len(key) < MIN_KEY_LENGTH:
+            return JsonResponse(
+                {'status': 'error', 'message': f'Idempotency-Key must be at least {MIN_KEY_LENGTH} random characters'},
+                status=400,
+            )
+
+        record_id = f'{view.__name__}:{_scope(request)}:{key}'
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+
+        while True:
+            owned, record = _claim(record_id, fingerprint)
+            if owned:
+                request.idempotency_record_id = record_id
+                request.idempotency_resumed = record
+                return _run_and_record(record_id, view, request, args, kwargs)
+            if record is None:
+                continue  # released or expired in between: try to claim again
+            if record['fingerprint'] != fingerprint:
+                return JsonResponse(
+                    {'status': 'error', 'message': 'Idempotency-Key was already used for a different request'},
+                    status=422,
+                )
+            if record['status'] == 'done':
+                return _replay(record)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                response = JsonResponse(
+                    {'status': 'error', 'message': 'The original request is still in progress.'},
+                    status=409,
+                )
+                response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+                return response
+            _wait(record_id, remaining)
+
+    return wrapper
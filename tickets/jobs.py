@@ -0,0 +1,296 @@
+"""
+Background ticket generation jobs.
+
+Large batches are rendered off the request path by a local thread pool.
+The job state lives in MongoDB (`generation_jobs`), so any gunicorn worker can
+report progress, and a job whose worker died is picked up again on the next
+status poll instead of being lost. Result ZIPs expire after
+TICKET_JOB_RESULT_TTL_HOURS and are deleted by `manage.py purge_expired_files`.
+
+Workers render in the same process as gate validation, so each ticket is
+rendered in a render slot (admission.py) like a request's. Slots are taken
+without queueing – a job never gets one ahead of a waiting request – and the
+job keeps its heartbeat fresh while it waits.
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .mongodb_utils import (
+    DUPLICATE_KEY, get_jobs_collection, get_tickets_collection, get_gridfs_bucket, get_mongo_db,
+    bump_ticket_change_seq,
+)
+from .ticket_ids import new_ticket_id
+
+# Identifies this process in the job record (useful when debugging stuck jobs)
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+# How often (in rendered tickets) a running job writes its progress
+PROGRESS_EVERY = 10
+
+# How often a job waiting for a render slot checks for one, and how often
+# (in seconds) it refreshes its heartbeat meanwhile so it isn't taken for dead
+SLOT_POLL_SECONDS = 0.05
+SLOT_HEARTBEAT_SECONDS = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Lazily create the process-wide worker pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TICKET_JOB_WORKERS,
+                    thread_name_prefix='ticket-job',
+                )
+    return _executor
+
+
+def submit_generation_job(count, design_config=None, encoding='png', event_id=None, created_by=None):
+    """
+    Record a new generation job and hand it to the local worker pool.
+    Returns the job ID.
+    """
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    get_jobs_collection().insert_one({
+        'job_id':       job_id,
+        'status':       'queued',
+        'count':        count,
+        'rendered':     0,
+        'design':       design_config or {},
+        'encoding':     encoding,
+        'event_id':     event_id or settings.DEFAULT_EVENT_ID,
+        'created_by':   created_by,
+        'ticket_ids':   [],
+        'attempts':     0,
+        'error':        None,
+        'result_file_id': None,
+        'created_at':   now,
+        'heartbeat_at': now,
+        'finished_at':  None,
+    })
+    _get_executor().submit(run_generation_job, job_id)
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Return the job record (or None), re-queuing it locally if its worker
+    looks dead.
+    """
+    job = get_jobs_collection().find_one({'job_id': job_id}, {'_id': 0})
+    if job and _is_stale(job) and _mark_requeued(job_id):
+        _get_executor().submit(run_generation_job, job_id)
+    return job
+
+
+def open_job_result(job):
+    """Return a file-like GridFS stream with the finished job's ZIP."""
+    return get_gridfs_bucket().open_download_stream(job['result_file_id'])
+
+
+def _is_stale(job):
+    if job['status'] not in ('queued', 'running'):
+        return False
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.TICKET_JOB_STALE_SECONDS)
+    return job['heartbeat_at'] < cutoff
+
+
+def _mark_requeued(job_id):
+    """
+    Record that a stale job is being re-submitted. Only one poll per stale
+    period wins, so polling a dead job doesn't queue a task per request.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.TICKET_JOB_STALE_SECONDS)
+    return get_jobs_collection().find_one_and_update(
+        {
+            'job_id': job_id,
+            'status': {'$in': ['queued', 'running']},
+            'heartbeat_at': {'$lt': cutoff},
+            '$or': [{'requeued_at': None}, {'requeued_at': {'$lt': cutoff}}],
+        },
+        {'$set': {'requeued_at': now}},
+    ) is not None
+
+
+def purge_expired_files():
+    """
+    Delete GridFS files whose metadata.expires_at has passed (job ZIPs, stored
+    idempotent responses) and mark the jobs that produced them expired.
+    Returns the number of files deleted.
+    """
+    bucket = get_gridfs_bucket()
+    files = get_mongo_db()['fs.files']
+    files.create_index('metadata.expires_at', sparse=True)
+
+    expired = [doc['_id'] for doc in files.find(
+        {'metadata.expires_at': {'$lt': datetime.utcnow()}}, {'_id': 1},
+    )]
+    for file_id in expired:
+        bucket.delete(file_id)
+    if expired:
+        get_jobs_collection().update_many(
+            {'result_file_id': {'$in': expired}},
+            {'$set': {'status': 'expired', 'result_file_id': None}},
+        )
+    return len(expired)
+
+
+def _claim_job(job_id):
+    """
+    Atomically take ownership of a queued or abandoned job.
+    Returns the job record, or None if another worker owns it (or it's finished).
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.TICKET_JOB_STALE_SECONDS)
+    return get_jobs_collection().find_one_and_update(
+        {
+            'job_id': job_id,
+            '$or': [
+                {'status': 'queued', 'attempts': 0},
+                {'status': {'$in': ['queued', 'running']}, 'heartbeat_at': {'$lt': cutoff}},
+            ],
+        },
+        {
+            '$set': {'status': 'running', 'worker': WORKER_ID, 'heartbeat_at': now},
+            '$inc': {'attempts': 1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _create_job_tickets(job):
+    """
+    Create the job's tickets in MongoDB.
+    IDs are recorded on the job first and inserted with upserts, so a job
+    resumed after a crash never creates the same batch twice.
+    """
+    jobs = get_jobs_collection()
+    ticket_ids = job.get('ticket_ids') or []
+    if not ticket_ids:
+        # Only the first worker to get here picks the IDs; a racing one reuses them
+        jobs.update_one(
+            {'job_id': job['job_id'], 'ticket_ids': {'$size': 0}},
+            {'$set': {'ticket_ids': [new_ticket_id() for _ in range(job['count'])]}},
+        )
+        ticket_ids = jobs.find_one({'job_id': job['job_id']}, {'ticket_ids': 1})['ticket_ids']
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {'ticket_id': tid},
+            {'$setOnInsert': {
+                'ticket_id':  tid,
+                'is_used':    False,
+                'scanned_at': None,
+                'created_at': now,
+                'event_id':   job['event_id'],
+                'batch_id':   job['job_id'],
+                'created_by': job.get('created_by'),
+            }},
+            upsert=True,
+        )
+        for tid in ticket_ids
+    ]
+    try:
+        get_tickets_collection().bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        # Two workers upserting the same ticket: the unique index lets one win
+        if any(err['code'] != DUPLICATE_KEY for err in exc.details['writeErrors']):
+            raise
+    bump_ticket_change_seq([job['event_id']])
+    return ticket_ids
+
+
+def _discard_job_tickets(job):
+    """Delete a failed job's tickets: they were never delivered, so nobody can hold them."""
+    deleted = get_tickets_collection().delete_many({'batch_id': job['job_id'], 'is_used': False}).deleted_count
+    if deleted:
+        bump_ticket_change_seq([job['event_id']])
+
+
+@contextmanager
+def _render_slot(heartbeat):
+    """Hold a render slot (admission.py), polling for a free one without queueing."""
+    from .admission import CLASSES
+
+    render = CLASSES['render']
+    last_beat = time.monotonic()
+    while not render.try_acquire():
+        time.sleep(SLOT_POLL_SECONDS)
+        if time.monotonic() - last_beat >= SLOT_HEARTBEAT_SECONDS:
+            heartbeat()
+            last_beat = time.monotonic()
+    try:
+        yield
+    finally:
+        render.release()
+
+
+def run_generation_job(job_id):
+    """Worker entry point: create, render and store one job's tickets."""
+    job = _claim_job(job_id)
+    if not job:
+        return
+
+    jobs = get_jobs_collection()
+
+    def report(done):
+        if done % PROGRESS_EVERY == 0 or done == job['count']:
+            jobs.update_one(
+                {'job_id': job_id},
+                {'$set': {'rendered': done, 'heartbeat_at': datetime.utcnow()}},
+            )
+
+    def heartbeat():
+        jobs.update_one({'job_id': job_id}, {'$set': {'heartbeat_at': datetime.utcnow()}})
+
+    # Imported here: rendering pulls in Pillow/qrcode, only workers need them
+    from .rendering import write_tickets_zip
+
+    try:
+        ticket_ids = _create_job_tickets(job)
+        expires_at = datetime.utcnow() + timedelta(hours=settings.TICKET_JOB_RESULT_TTL_HOURS)
+        with tempfile.TemporaryFile() as tmp:
+            write_tickets_zip(tmp, ticket_ids, job.get('design'), progress=report,
+                              profile=job.get('encoding', 'png'),
+                              render_slot=lambda: _render_slot(heartbeat))
+            tmp.seek(0)
+            file_id = get_gridfs_bucket().upload_from_stream(
+                f'tickets_{job_id}.zip', tmp, metadata={'job_id': job_id, 'expires_at': expires_at},
+            )
+    except Exception as exc:
+        jobs.update_one(
+            {'job_id': job_id},
+            {'$set': {'status': 'failed', 'error': str(exc), 'finished_at': datetime.utcnow()}},
+        )
+        _discard_job_tickets(job)
+        return
+
+    jobs.update_one(
+        {'job_id': job_id},
+        {'$set': {
+            'status': 'done',
+            'rendered': len(ticket_ids),
+            'result_file_id': file_id,
+            'expires_at': expires_at,
+            'finished_at': datetime.utcnow(),
+        }},
+    )
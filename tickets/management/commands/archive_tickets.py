@@ -0,0 +1,57 @@
+"""
+Move finished events' tickets out of the hot collection.
+
+    python manage.py archive_tickets --event techfest-2024
+    python manage.py archive_tickets --older-than-days 180 --to-file archive/2024.ndjson.gz
+
+With neither --event nor --batch, batches older than TICKET_ARCHIVE_AFTER_DAYS
+are archived. Use --list to see the archived summaries.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.archive import archive_query, archive_tickets, archived_summaries
+from tickets.mongodb_utils import get_tickets_collection
+
+
+class Command(BaseCommand):
+    help = 'Archive tickets of an event, a batch or older than an age (collection or gzip NDJSON).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', help='Archive this event')
+        parser.add_argument('--batch', help='Archive this batch')
+        parser.add_argument('--older-than-days', type=int,
+                            help='Only tickets created before this many days ago')
+        parser.add_argument('--to-file', help='Append to this gzip NDJSON file instead of the archive collection')
+        parser.add_argument('--batch-size', type=int, default=None, help='Tickets moved per round trip')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the matching tickets')
+        parser.add_argument('--list', action='store_true', help='Print the archived summaries and exit')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for summary in archived_summaries(options['event']):
+                self.stdout.write(
+                    f"{summary['event_id']}\t{summary.get('batch_id')}\t"
+                    f"total={summary['total']}\tused={summary['used']}\t{','.join(summary.get('locations', []))}"
+                )
+            return
+
+        older_than = options['older_than_days']
+        if older_than is None and not (options['event'] or options['batch']):
+            older_than = settings.TICKET_ARCHIVE_AFTER_DAYS
+
+        try:
+            query = archive_query(options['event'], older_than, options['batch'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['dry_run']:
+            self.stdout.write(f'{get_tickets_collection().count_documents(query)} tickets would be archived')
+            return
+
+        started = time.perf_counter()
+        moved = archive_tickets(query, path=options['to_file'], batch_size=options['batch_size'])
+        self.stderr.write(f'Archived {moved} tickets in {time.perf_counter() - started:.1f}s')
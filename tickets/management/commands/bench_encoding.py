@@ -0,0 +1,36 @@
+"""
+Compare ticket encoding profiles: bytes per ticket and encode time.
+
+    python manage.py bench_encoding --count 50
+"""
+
+import base64
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from tickets.rendering import ENCODING_PROFILES, encode_ticket_image, render_ticket
+
+
+class Command(BaseCommand):
+    help = 'Report size and encode time per ticket for each encoding profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='Tickets to encode per profile')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        images = [render_ticket(str(uuid.uuid4())) for _ in range(count)]
+
+        self.stdout.write(f'{"profile":<12} {"bytes":>9} {"base64":>9} {"encode ms":>10}')
+        for name in ENCODING_PROFILES:
+            start = time.perf_counter()
+            encoded = [encode_ticket_image(img, name) for img in images]
+            elapsed = time.perf_counter() - start
+            total_bytes = sum(len(data) for data in encoded)
+            b64_bytes = sum(len(base64.b64encode(data)) for data in encoded)
+            self.stdout.write(
+                f'{name:<12} {total_bytes // count:>9} {b64_bytes // count:>9} '
+                f'{elapsed * 1000 / count:>10.2f}'
+            )
@@ -0,0 +1,57 @@
+"""
+Compare cold-start cost with FAST_COLD_START on and off.
+
+Each run starts a fresh interpreter, loads the WSGI application and serves a
+first request, like an instance waking up on the free tier:
+
+    python manage.py bench_startup --runs 5 --path /api/cron/ping/
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in the child interpreter; prints timings in milliseconds as JSON
+PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+from entry_system.wsgi import application
+t1 = time.perf_counter()
+from django.test import Client
+Client(HTTP_HOST='localhost', raise_request_exception=False).get(sys.argv[1], secure=True)
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'first_request_ms': (t2 - t1) * 1000,
+                  'modules': len(sys.modules)}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure WSGI import time and first-request time with and without FAST_COLD_START.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/api/cron/ping/', help='First request to serve')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"mode":<6} {"import ms":>10} {"first req ms":>13} {"total ms":>9} {"modules":>8}')
+        for fast in ('True', 'False'):
+            env = dict(os.environ, FAST_COLD_START=fast, DJANGO_SETTINGS_MODULE='entry_system.settings')
+            samples = []
+            for _ in range(options['runs']):
+                out = subprocess.run(
+                    [sys.executable, '-c', PROBE, options['path']],
+                    env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+                )
+                samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+            import_ms = statistics.median(s['import_ms'] for s in samples)
+            request_ms = statistics.median(s['first_request_ms'] for s in samples)
+            self.stdout.write(
+                f'{"fast" if fast == "True" else "eager":<6} {import_ms:>10.1f} {request_ms:>13.1f} '
+                f'{import_ms + request_ms:>9.1f} {samples[-1]["modules"]:>8}'
+            )
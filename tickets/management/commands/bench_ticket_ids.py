@@ -0,0 +1,81 @@
+"""
+Measure how the ticket ID format and QR error correction level affect the QR
+code: version, QR render time and how reliably a decoder reads it back.
+
+    python manage.py bench_ticket_ids --count 50 --scale 0.35
+
+Decoding uses OpenCV's QR detector when `opencv-python-headless` is installed
+(it is not a runtime dependency); otherwise the decode rate is reported as n/a.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import ImageFilter
+
+from tickets.qr import ERROR_CORRECTION_LEVELS, qr_image, qr_modules, qr_version
+from tickets.rendering import QR_SIZE, render_ticket
+from tickets.ticket_ids import ID_FORMATS, new_ticket_id
+
+
+def _load_decoder():
+    try:
+        import cv2
+        import numpy
+    except ImportError:
+        return None
+    detector = cv2.QRCodeDetector()
+
+    def decode(img):
+        data, _, _ = detector.detectAndDecode(numpy.asarray(img.convert('L')))
+        return data
+    return decode
+
+
+class Command(BaseCommand):
+    help = 'Report QR version, QR render time and decode rate per ticket ID format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=30, help='Tickets per combination')
+        parser.add_argument('--levels', default='M,H', help='Error correction levels to compare')
+        parser.add_argument('--scale', type=float, default=0.35,
+                            help='Downscale factor applied before decoding (simulates a far webcam)')
+
+    def handle(self, *args, **options):
+        count, scale = options['count'], options['scale']
+        decode = _load_decoder()
+
+        self.stdout.write(
+            f'{"format":<8} {"ec":<3} {"len":>4} {"version":>8} {"modules":>8} '
+            f'{"px/module":>10} {"qr ms":>10} {"decoded":>8}'
+        )
+        for id_format in ID_FORMATS:
+            for level in options['levels'].upper().split(','):
+                ec = ERROR_CORRECTION_LEVELS[level]
+                ids = [new_ticket_id(id_format) for _ in range(count)]
+
+                # The per-ticket QR work of render_ticket: encode the fresh ID
+                # and rasterize it at ticket size
+                start = time.perf_counter()
+                for tid in ids:
+                    qr_image(tid, QR_SIZE, ec)
+                qr_ms = (time.perf_counter() - start) * 1000 / count
+                n, _ = qr_modules(ids[0], ec)
+
+                decoded = 'n/a'
+                if decode:
+                    ok = 0
+                    for tid in ids:
+                        # Full ticket, shrunk and slightly blurred like a webcam frame
+                        with override_settings(TICKET_QR_ERROR_CORRECTION=level):
+                            img = render_ticket(tid)
+                        img = img.resize((int(img.width * scale), int(img.height * scale)))
+                        img = img.filter(ImageFilter.GaussianBlur(0.6))
+                        ok += decode(img) == tid
+                    decoded = f'{ok * 100 // count}%'
+
+                self.stdout.write(
+                    f'{id_format:<8} {level:<3} {len(ids[0]):>4} {qr_version(ids[0], ec):>8} '
+                    f'{n:>8} {QR_SIZE * scale / n:>10.2f} {qr_ms:>10.2f} {decoded:>8}'
+                )
@@ -0,0 +1,51 @@
+"""
+Remove duplicate tickets so the unique ticket_id index can be built.
+
+Databases created before the index was unique may hold the same ticket twice
+(e.g. an import run twice, or a legacy ticket without an event re-imported
+into the default event), letting one ticket admit two people. For every
+duplicated ticket one document is kept – a used one if any copy was scanned,
+so the scan isn't undone – and the others are deleted. Then the ticket_id
+index is rebuilt as unique (a full collection scan, so it happens here
+rather than on the request path):
+
+    python manage.py dedupe_tickets --dry-run
+    python manage.py dedupe_tickets
+"""
+
+from django.core.management.base import BaseCommand
+
+from tickets import mongodb_utils
+
+
+class Command(BaseCommand):
+    help = 'Delete duplicate ticket IDs and build the unique ticket_id index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the duplicates')
+
+    def handle(self, *args, **options):
+        tickets = mongodb_utils.get_mongo_db()['tickets']
+        duplicates = tickets.aggregate([
+            {'$sort': {'is_used': -1, 'scanned_at': 1}},
+            {'$group': {
+                '_id':   '$ticket_id',
+                'ids':   {'$push': '$_id'},
+                'count': {'$sum': 1},
+            }},
+            {'$match': {'count': {'$gt': 1}}},
+        ], allowDiskUse=True)
+
+        tickets_affected = removed = 0
+        for group in duplicates:
+            tickets_affected += 1
+            extra = group['ids'][1:]  # first one is the used (or earliest scanned) copy
+            removed += len(extra)
+            if not options['dry_run']:
+                tickets.delete_many({'_id': {'$in': extra}})
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stderr.write(f'{verb} {removed} duplicate documents of {tickets_affected} tickets')
+        if not options['dry_run']:
+            mongodb_utils.upgrade_ticket_indexes(tickets)
+            self.stderr.write('ticket_id index is unique')
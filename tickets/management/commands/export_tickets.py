@@ -0,0 +1,64 @@
+"""
+Export tickets to NDJSON or CSV, streaming from a batched Mongo cursor so
+memory stays flat however many tickets there are.
+
+    python manage.py export_tickets --event techfest --format csv -o scans.csv
+"""
+
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets.mongodb_utils import get_tickets_collection, event_filter
+
+FIELDS = ('ticket_id', 'event_id', 'batch_id', 'is_used', 'scanned_at', 'created_at')
+
+
+def _plain(value):
+    """JSON/CSV friendly value (datetimes as ISO 8601)."""
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class Command(BaseCommand):
+    help = 'Export tickets (optionally one event or batch) to NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', help='Only tickets of this event')
+        parser.add_argument('--batch', help='Only tickets of this batch')
+        parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+        parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cursor batch size')
+
+    def handle(self, *args, **options):
+        query = event_filter(options['event']) if options['event'] else {}
+        if options['batch']:
+            query['batch_id'] = options['batch']
+
+        cursor = get_tickets_collection().find(
+            query, {field: 1 for field in FIELDS} | {'_id': 0}, batch_size=options['batch_size'],
+        )
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        started = time.perf_counter()
+        exported = 0
+        try:
+            if options['format'] == 'csv':
+                writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction='ignore')
+                writer.writeheader()
+                for doc in cursor:
+                    writer.writerow({k: _plain(v) for k, v in doc.items()})
+                    exported += 1
+            else:
+                for doc in cursor:
+                    out.write(json.dumps({k: _plain(v) for k, v in doc.items()}) + '\n')
+                    exported += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Exported {exported} tickets in {elapsed:.1f}s '
+                          f'({exported / elapsed if elapsed else 0:.0f}/s)')
@@ -0,0 +1,168 @@
+"""
+Bulk-import existing ticket IDs.
+
+Reads NDJSON (objects with at least `ticket_id`), CSV (with a `ticket_id`
+column) or plain text (one ID per line) line by line and inserts them in
+chunks with unordered insert_many. Progress is checkpointed after every
+chunk, so an interrupted import resumes where it stopped:
+
+    python manage.py import_tickets attendees.csv --event techfest
+"""
+
+import csv
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import BulkWriteError
+
+from tickets.mongodb_utils import DUPLICATE_KEY, get_tickets_collection, bump_ticket_change_seq
+from tickets.views import requested_event_id
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+class Command(BaseCommand):
+    help = 'Import ticket IDs from NDJSON, CSV or plain text in resumable chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file')
+        parser.add_argument('--format', choices=('ndjson', 'csv', 'txt'),
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--event', default=None, help='Event for the imported tickets')
+        parser.add_argument('--batch', default=None, help='Batch ID (default: a new one)')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt == 'json':
+            fmt = 'ndjson'
+        if fmt not in ('ndjson', 'csv', 'txt'):
+            raise CommandError(f'Cannot tell the format of {path}; pass --format')
+
+        # Same rule as the API, so imported tickets can be scanned and filtered
+        try:
+            event_id = requested_event_id(options['event']) or settings.DEFAULT_EVENT_ID
+        except ValueError as exc:
+            raise CommandError(f'{exc}: {options["event"]!r}')
+
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        state = {'lines': 0, 'imported': 0, 'skipped': 0,
+                 'batch_id': options['batch'] or uuid.uuid4().hex}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as f:
+                state.update(json.load(f))
+            self.stderr.write(f'Resuming after line {state["lines"]} '
+                              f'({state["imported"]} already imported)')
+
+        self.event_id = event_id
+        self.batch_id = state['batch_id']
+        self.tickets = get_tickets_collection()
+        self.state = state
+        self.checkpoint_path = checkpoint_path
+        self.started = time.perf_counter()
+        self.imported_before = state['imported']
+
+        # The first chunk after a resume may have been partly written before
+        # the interruption, so it's checked against the database
+        resumed = state['lines'] > 0
+
+        chunk = []
+        line_no = state['lines']
+        with open(path, newline='', encoding='utf-8') as f:
+            for line_no, doc in enumerate(self._rows(f, fmt), start=1):
+                if line_no <= state['lines']:
+                    continue
+                if doc:
+                    chunk.append(doc)
+                if len(chunk) >= options['chunk_size']:
+                    self._write(chunk, line_no, resumed)
+                    chunk, resumed = [], False
+        if chunk:
+            self._write(chunk, line_no, resumed)
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - self.started
+        done = state['imported'] - self.imported_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {done} tickets ({state["skipped"]} duplicates skipped) into event '
+            f'{self.event_id}, batch {self.batch_id} in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f}/s)'
+        ))
+
+    def _rows(self, f, fmt):
+        """Yield one ticket document (or None for blank lines) per input record."""
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            if 'ticket_id' not in (reader.fieldnames or []):
+                raise CommandError('CSV input needs a ticket_id column')
+            records = reader
+        elif fmt == 'ndjson':
+            records = (json.loads(line) if line.strip() else None for line in f)
+        else:
+            records = ({'ticket_id': line.strip()} if line.strip() else None for line in f)
+
+        now = datetime.utcnow()
+        for record in records:
+            if not record or not record.get('ticket_id'):
+                yield None
+                continue
+            yield {
+                'ticket_id':  str(record['ticket_id']).strip(),
+                'is_used':    _parse_bool(record.get('is_used', False)),
+                'scanned_at': _parse_datetime(record.get('scanned_at')),
+                'created_at': _parse_datetime(record.get('created_at')) or now,
+                'event_id':   self.event_id,
+                'batch_id':   self.batch_id,
+            }
+
+    def _write(self, chunk, line_no, resumed):
+        """Insert one chunk, then checkpoint the input position."""
+        state = self.state
+        if resumed:
+            existing = {
+                doc['ticket_id'] for doc in self.tickets.find(
+                    {'ticket_id': {'$in': [d['ticket_id'] for d in chunk]}},
+                    {'ticket_id': 1, '_id': 0},
+                )
+            }
+            state['skipped'] += sum(1 for d in chunk if d['ticket_id'] in existing)
+            chunk = [d for d in chunk if d['ticket_id'] not in existing]
+
+        if chunk:
+            try:
+                result = self.tickets.insert_many(chunk, ordered=False)
+                state['imported'] += len(result.inserted_ids)
+            except BulkWriteError as exc:
+                errors = exc.details.get('writeErrors', [])
+                if any(err.get('code') != DUPLICATE_KEY for err in errors):
+                    raise
+                state['imported'] += exc.details.get('nInserted', 0)
+                state['skipped'] += len(errors)
+            bump_ticket_change_seq([self.event_id])
+
+        state['lines'] = line_no
+        with open(self.checkpoint_path, 'w') as f:
+            json.dump(state, f)
+
+        elapsed = time.perf_counter() - self.started
+        done = state['imported'] - self.imported_before
+        self.stderr.write(f'  line {line_no}: {state["imported"]} imported, '
+                          f'{done / elapsed if elapsed else 0:.0f} tickets/s')
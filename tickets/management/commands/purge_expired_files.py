@@ -0,0 +1,19 @@
+"""
+Delete expired GridFS files: generation job ZIPs older than
+TICKET_JOB_RESULT_TTL_HOURS and stored Idempotency-Key responses.
+Run it periodically (e.g. a daily cron) so free-tier storage doesn't fill up:
+
+    python manage.py purge_expired_files
+"""
+
+from django.core.management.base import BaseCommand
+
+from tickets.jobs import purge_expired_files
+
+
+class Command(BaseCommand):
+    help = 'Delete GridFS files (job results, idempotent responses) past their expiry.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_files()
+        self.stderr.write(f'Deleted {deleted} expired files')
@@ -0,0 +1,31 @@
+"""
+Move archived tickets back into the hot collection.
+
+    python manage.py restore_tickets --event techfest-2024
+    python manage.py restore_tickets --from-file archive/2024.ndjson.gz
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.archive import restore_tickets
+
+
+class Command(BaseCommand):
+    help = 'Restore archived tickets of an event or batch, or from a gzip NDJSON archive file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', help='Restore this event from the archive collection')
+        parser.add_argument('--batch', help='Restore this batch from the archive collection')
+        parser.add_argument('--from-file', help='Restore everything in this gzip NDJSON file')
+        parser.add_argument('--batch-size', type=int, default=None, help='Tickets moved per round trip')
+
+    def handle(self, *args, **options):
+        if not (options['event'] or options['batch'] or options['from_file']):
+            raise CommandError('Pass --event, --batch or --from-file')
+
+        started = time.perf_counter()
+        restored = restore_tickets(options['event'], options['batch'], options['from_file'],
+                                   batch_size=options['batch_size'])
+        self.stderr.write(f'Restored {restored} tickets in {time.perf_counter() - started:.1f}s')
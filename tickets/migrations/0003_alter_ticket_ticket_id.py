@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-19 10:00
+
+from django.db import migrations, models
+import tickets.ticket_ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_ticket_created_by'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='ticket_id',
+            field=models.CharField(default=tickets.ticket_ids.new_ticket_id, max_length=100, unique=True),
+        ),
+    ]
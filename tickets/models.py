@@ -1,10 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
-import uuid
+from .ticket_ids import new_ticket_id
 
 class Ticket(models.Model):
     # Unique ID for the ticket (prevents guessing)
-    ticket_id = models.CharField(max_length=100, unique=True, default=uuid.uuid4)
+    ticket_id = models.CharField(max_length=100, unique=True, default=new_ticket_id)
     
     # Track who created this ticket
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -3,15 +3,36 @@ MongoDB utility functions for direct MongoDB access.
 This allows using MongoDB alongside Django's default database.
 """
 
-from pymongo import MongoClient
+import logging
+import threading
+
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+# MongoDB error code for a unique index violation
+DUPLICATE_KEY = 11000
+
+_client = None
+_client_lock = threading.Lock()
+_ticket_indexes_ready = False
+
 
 def get_mongo_client():
     """
-    Returns a MongoDB client instance.
+    Returns the shared MongoDB client instance.
+    MongoClient is thread-safe and pools connections, so one per process is
+    enough (background job workers reuse it too).
     """
-    return MongoClient(settings.MONGODB_URI)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Imported on first use: pymongo is a large import and
+                # keep-alive pings on a waking instance never need it
+                from pymongo import MongoClient
+                _client = MongoClient(settings.MONGODB_URI)
+    return _client
 
 
 def get_mongo_db():
@@ -24,10 +45,170 @@ def get_mongo_db():
 
 def get_tickets_collection():
     """
-    Returns the tickets collection from MongoDB.
+    Returns the tickets collection from MongoDB
+    (creating its indexes on first use in this process).
+    """
+    db = get_mongo_db()
+    tickets = db['tickets']
+    if not _ticket_indexes_ready:
+        ensure_ticket_indexes(tickets)
+    return tickets
+
+
+# Indexes the hot paths rely on: validation looks tickets up by ticket_id,
+# stats count (event_id, is_used), batch queries filter (event_id, batch_id),
+# and the per-creator/batch stats aggregation is covered by
+# (event_id, created_by, batch_id, is_used) for one event, or by
+# (created_by, batch_id, is_used) for one organiser across all events
+TICKET_ID_INDEX = [('ticket_id', 1)]
+TICKET_INDEXES = [
+    [('event_id', 1), ('is_used', 1)],
+    [('event_id', 1), ('batch_id', 1)],
+    [('event_id', 1), ('created_by', 1), ('batch_id', 1), ('is_used', 1)],
+    [('created_by', 1), ('batch_id', 1), ('is_used', 1)],
+]
+
+
+def ensure_ticket_indexes(tickets):
+    """
+    Create any missing ticket indexes. Runs on the first request of each
+    process, so when they all exist it costs one round trip and never
+    rebuilds anything.
+
+    ticket_id is unique on its own – IDs are random, and one document per
+    ID is what makes a ticket admit exactly one person, whatever event a
+    scanner names (legacy tickets without an event_id included). A database
+    whose ticket_id index predates that keeps it until `manage.py
+    dedupe_tickets` removes the duplicates and upgrades it.
+    """
+    from pymongo.errors import DuplicateKeyError, OperationFailure
+
+    global _ticket_indexes_ready
+    existing = {tuple(info['key']): info for info in tickets.index_information().values()}
+
+    ticket_id = existing.get(tuple(TICKET_ID_INDEX))
+    if ticket_id is None:
+        try:
+            tickets.create_index(TICKET_ID_INDEX, unique=True)
+        except (DuplicateKeyError, OperationFailure) as exc:
+            if getattr(exc, 'code', None) != DUPLICATE_KEY:
+                raise
+            logger.error('Tickets collection has duplicate ticket IDs; '
+                         'run `manage.py dedupe_tickets` to make tickets unique')
+            tickets.create_index(TICKET_ID_INDEX)
+    elif not ticket_id.get('unique'):
+        logger.warning('ticket_id index is not unique yet; run `manage.py dedupe_tickets`')
+
+    for keys in TICKET_INDEXES:
+        if tuple(keys) not in existing:
+            tickets.create_index(keys)
+    _ticket_indexes_ready = True
+
+
+def upgrade_ticket_indexes(tickets):
+    """
+    Replace a non-unique ticket_id index with the unique one (and drop the
+    older (event_id, ticket_id) index it supersedes). Raises DuplicateKeyError
+    while duplicates remain. Run from `manage.py dedupe_tickets`, never on
+    the request path: the rebuild scans the whole collection.
+    """
+    for name, info in tickets.index_information().items():
+        key = list(info['key'])
+        if key == [('event_id', 1), ('ticket_id', 1)] or (key == TICKET_ID_INDEX and not info.get('unique')):
+            tickets.drop_index(name)
+    tickets.create_index(TICKET_ID_INDEX, unique=True)
+    ensure_ticket_indexes(tickets)
+
+
+def event_filter(event_id):
+    """
+    Query fragment selecting one event's tickets.
+    Tickets created before events existed have no event_id and belong to
+    settings.DEFAULT_EVENT_ID.
+    """
+    if event_id == settings.DEFAULT_EVENT_ID:
+        return {'event_id': {'$in': [event_id, None]}}
+    return {'event_id': event_id}
+
+
+def get_jobs_collection():
+    """
+    Returns the background generation jobs collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['generation_jobs']
+
+
+def get_gridfs_bucket():
+    """
+    Returns the GridFS bucket used to store generated files (job ZIPs, ...).
+    """
+    import gridfs
+    return gridfs.GridFSBucket(get_mongo_db())
+
+
+def get_scan_events_collection():
+    """
+    Returns the (capped) scan event log collection from MongoDB.
     """
     db = get_mongo_db()
-    return db['tickets']
+    return db['scan_events']
+
+
+def get_scan_rollups_collection():
+    """
+    Returns the per-gate, per-minute scan counters collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['scan_rollups']
+
+
+def get_archive_collection():
+    """
+    Returns the archived (cold) tickets collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['tickets_archive']
+
+
+def get_archived_stats_collection():
+    """
+    Returns the per-event/batch archived ticket summaries collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['archived_stats']
+
+
+def get_pool_collection():
+    """
+    Returns the pre-rendered (unassigned) ticket pool collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['ticket_pool']
+
+
+def get_pool_designs_collection():
+    """
+    Returns the warm pool's recently used designs collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['pool_designs']
+
+
+def get_idempotency_collection():
+    """
+    Returns the Idempotency-Key records collection from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['idempotency_keys']
+
+
+def get_counters_collection():
+    """
+    Returns the counters collection (change sequence numbers) from MongoDB.
+    """
+    db = get_mongo_db()
+    return db['counters']
 
 
 def get_users_collection():
@@ -102,20 +283,114 @@ def get_user_by_username(username):
     return None
 
 
-def get_ticket_stats():
+def _change_seq_id(event_id):
+    return f'tickets:{event_id}' if event_id else 'tickets'
+
+
+def ticket_change_seq(event_id=None):
+    """
+    Current ticket change sequence number for one event (or across all
+    events): bumped whenever its tickets are created, validated or moved, so
+    a changed number means changed stats. Each event has its own counter, so
+    activity in one event doesn't invalidate the others' dashboards.
+    """
+    doc = get_counters_collection().find_one({'_id': _change_seq_id(event_id)})
+    return doc['seq'] if doc else 0
+
+
+def bump_ticket_change_seq(event_ids):
+    """
+    Mark the ticket stats of `event_ids` (and of all events) as changed, once
+    per write batch. Sent unacknowledged (w=0) in one round trip: callers
+    (validation included) don't wait for it.
     """
-    Returns ticket statistics (total, used, available).
+    from pymongo import UpdateOne, WriteConcern
+
+    operations = [
+        UpdateOne({'_id': _change_seq_id(event_id)}, {'$inc': {'seq': 1}}, upsert=True)
+        for event_id in [None, *sorted(set(event_ids))]
+    ]
+    get_counters_collection().with_options(write_concern=WriteConcern(w=0)).bulk_write(operations, ordered=False)
+
+
+def get_ticket_stats(event_id=None):
     """
+    Returns ticket statistics (total, used, available) for one event,
+    or across all events if event_id is None.
+    Archived tickets are included from their precomputed summaries.
+    """
+    from .archive import archived_stats
+
     tickets = get_tickets_collection()
+    query = event_filter(event_id) if event_id else {}
+    archived = archived_stats(event_id)
     
-    total_tickets = tickets.count_documents({})
-    used_tickets = tickets.count_documents({'is_used': True})
+    total_tickets = tickets.count_documents(query) + archived['total']
+    used_tickets = tickets.count_documents({**query, 'is_used': True}) + archived['used']
     available_tickets = total_tickets - used_tickets
     
     return {
         'total': total_tickets,
         'used': used_tickets,
-        'available': available_tickets
+        'available': available_tickets,
+        'archived': archived['total'],
+    }
+
+
+def get_group_stats(event_id=None, created_by=None):
+    """
+    Returns ticket statistics grouped by batch and by creator, for one event
+    (or all events) and optionally one creator:
+    {'batches': [...], 'creators': [...]}, each entry with total/used/available.
+
+    Live tickets are counted in a single $group pass keyed by (creator, batch);
+    per-creator totals are folded from those rows (a batch has one creator).
+    Archived tickets are added from their precomputed summaries.
+    """
+    from .archive import archived_summaries
+
+    match = event_filter(event_id) if event_id else {}
+    if created_by:
+        match['created_by'] = created_by
+
+    batches = {}
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id':   {'created_by': '$created_by', 'batch_id': '$batch_id'},
+            'total': {'$sum': 1},
+            'used':  {'$sum': {'$cond': ['$is_used', 1, 0]}},
+        }},
+    ]
+    for row in get_tickets_collection().aggregate(pipeline):
+        key = (row['_id'].get('created_by'), row['_id'].get('batch_id'))
+        batches[key] = {'total': row['total'], 'used': row['used'], 'archived': 0}
+
+    for summary in archived_summaries(event_id):
+        if created_by and summary.get('created_by') != created_by:
+            continue
+        row = batches.setdefault((summary.get('created_by'), summary.get('batch_id')),
+                                 {'total': 0, 'used': 0, 'archived': 0})
+        row['total'] += summary['total']
+        row['used'] += summary['used']
+        row['archived'] += summary['total']
+
+    creators = {}
+    for (creator, _), row in batches.items():
+        totals = creators.setdefault(creator, {'total': 0, 'used': 0, 'archived': 0, 'batches': 0})
+        for field in ('total', 'used', 'archived'):
+            totals[field] += row[field]
+        totals['batches'] += 1
+
+    return {
+        'batches': [
+            {'batch_id': batch_id, 'created_by': creator, **row, 'available': row['total'] - row['used']}
+            for (creator, batch_id), row in sorted(batches.items(), key=lambda item: -item[1]['total'])
+        ],
+        'creators': [
+            {'created_by': creator, **row, 'available': row['total'] - row['used']}
+            for creator, row in sorted(creators.items(), key=lambda item: -item[1]['total'])
+        ],
     }
 
 
@@ -0,0 +1,62 @@
+"""
+Low-resolution design previews for the configurator.
+
+A preview is the ticket artwork for a design with a placeholder QR code,
+drawn directly at reduced size. Nothing is written to the database, and
+previews bypass the full-size background cache that ticket generation uses,
+so colour-picker changes don't evict real designs from it. Rendered previews are
+memoized by design hash in a small LRU cache, and the hash doubles as the
+ETag, so repeated colour-picker values are served from memory (or not sent
+at all when the browser already has them).
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .rendering import DEFAULT_DESIGN, design_hash, encode_ticket_image, render_ticket
+
+# Encoded into the placeholder QR code; never a valid ticket
+PLACEHOLDER_TICKET_ID = 'PREVIEW'
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def preview_design(design_config):
+    """
+    The design a preview is rendered with: defaults filled in for missing keys.
+    Raises ValueError if a text or colour field isn't a string.
+    """
+    design = {**DEFAULT_DESIGN, **(design_config or {})}
+    for key, default in DEFAULT_DESIGN.items():
+        if isinstance(default, str) and not isinstance(design[key], str):
+            raise ValueError(f'{key} must be a string')
+    return design
+
+
+def preview_etag(design_config, scale, encoding):
+    """ETag for a preview (quoted, as sent in the header)."""
+    return f'"{design_hash(preview_design(design_config))}-{scale}-{encoding}"'
+
+
+def render_preview(design_config, scale=2, encoding='png'):
+    """
+    Return the encoded preview bytes for a design at 1/`scale` size.
+    Raises ValueError for an invalid design.
+    """
+    key = preview_etag(design_config, scale, encoding)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    img = render_ticket(PLACEHOLDER_TICKET_ID, preview_design(design_config), scale=scale)
+    data = encode_ticket_image(img, encoding)
+
+    with _cache_lock:
+        _cache[key] = data
+        while len(_cache) > settings.DESIGN_PREVIEW_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
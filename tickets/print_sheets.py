@@ -0,0 +1,245 @@
+"""
+Print-sheet export: many tickets per page in a single multi-page PDF.
+
+The design background (everything except the ticket ID and the QR code) is
+embedded once as a JPEG image and reused by every ticket slot on every page.
+Per ticket only the ID text and the QR modules are added, as vector drawing
+commands, so a document with hundreds of tickets stays small and prints with
+crisp QR codes. Pages are yielded as soon as they are composed, so the PDF can
+be streamed to the client.
+"""
+
+import math
+import zlib
+from io import BytesIO
+
+from .qr import qr_rows
+from .rendering import (
+    TICKET_WIDTH, TICKET_HEIGHT, QR_SIZE, QR_X, QR_Y, ID_TEXT_X, ID_TEXT_Y,
+    render_ticket_background,
+)
+
+# Page sizes in PDF points (1/72 inch)
+PAPER_SIZES = {
+    'a4':     (595.28, 841.89),
+    'letter': (612.0, 792.0),
+}
+
+MM = 72 / 25.4
+
+DEFAULT_TICKET_WIDTH_MM = 90
+PAGE_MARGIN_MM = 10
+
+# Cut marks sit in the page margin, slightly away from the ticket grid
+CUT_MARK_OFFSET_MM = 2
+CUT_MARK_LENGTH_MM = 5
+
+ID_FONT_SIZE = 20
+
+
+class SheetLayout:
+    """Grid of equally sized ticket slots, centered on the page."""
+
+    def __init__(self, paper='a4', ticket_width_mm=DEFAULT_TICKET_WIDTH_MM):
+        if paper not in PAPER_SIZES:
+            raise ValueError(f'Unknown paper size: {paper}')
+        # Checked up front: 0 would divide by zero below, NaN fails in int()
+        valid_number = isinstance(ticket_width_mm, (int, float)) and math.isfinite(ticket_width_mm)
+        if not valid_number or ticket_width_mm <= 0:
+            raise ValueError('Ticket width must be a positive number of millimetres')
+        self.page_width, self.page_height = PAPER_SIZES[paper]
+
+        # Ticket size in points, keeping the 800x350 aspect ratio
+        self.ticket_width = ticket_width_mm * MM
+        self.ticket_height = self.ticket_width * TICKET_HEIGHT / TICKET_WIDTH
+
+        margin = PAGE_MARGIN_MM * MM
+        self.columns = int((self.page_width - 2 * margin) // self.ticket_width)
+        self.rows = int((self.page_height - 2 * margin) // self.ticket_height)
+        if self.columns < 1 or self.rows < 1:
+            raise ValueError('Ticket width does not fit on the page')
+
+        # Tickets are laid edge to edge so one cut separates two of them
+        self.grid_left = (self.page_width - self.columns * self.ticket_width) / 2
+        self.grid_bottom = (self.page_height - self.rows * self.ticket_height) / 2
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    def slot_origin(self, index):
+        """Bottom-left corner (in points) of slot `index`, filled row by row from the top."""
+        row, col = divmod(index, self.columns)
+        x = self.grid_left + col * self.ticket_width
+        y = self.grid_bottom + (self.rows - 1 - row) * self.ticket_height
+        return x, y
+
+
+def _fmt(value):
+    """Compact number formatting for PDF operators."""
+    return f'{value:.3f}'.rstrip('0').rstrip('.')
+
+
+def _pdf_string(text):
+    """
+    PDF literal string in the font's WinAnsi (cp1252) encoding, ASCII-only:
+    other bytes are octal escapes, and characters the font can't show become
+    '?' (the QR code still carries the real ID).
+    """
+    out = []
+    for byte in str(text).encode('cp1252', errors='replace'):
+        char = chr(byte)
+        if char in '\\()':
+            out.append('\\' + char)
+        elif 32 <= byte < 127:
+            out.append(char)
+        else:
+            out.append(f'\\{byte:03o}')
+    return '(' + ''.join(out) + ')'
+
+
+def _ticket_ops(ticket_id, x, y, scale):
+    """PDF drawing operators for one ticket's variable parts (ID text + QR)."""
+    ops = [f'q {_fmt(scale)} 0 0 {_fmt(scale)} {_fmt(x)} {_fmt(y)} cm']
+
+    # Background (shared image XObject, drawn in ticket pixel units)
+    ops.append(f'q {TICKET_WIDTH} 0 0 {TICKET_HEIGHT} 0 0 cm /Bg Do Q')
+
+    # Ticket ID – same text and position as the raster ticket, PDF y axis points up
+    id_text = f"TICKET ID: {str(ticket_id)[:8].upper()}"
+    baseline = TICKET_HEIGHT - ID_TEXT_Y - ID_FONT_SIZE * 0.8
+    ops.append(
+        f'BT 1 g /F1 {ID_FONT_SIZE} Tf {ID_TEXT_X} {_fmt(baseline)} Td '
+        f'{_pdf_string(id_text)} Tj ET'
+    )
+
+    # QR code – one rectangle per horizontal run of dark modules
+    matrix = qr_rows(ticket_id)
+    module = QR_SIZE / len(matrix)
+    ops.append('0 g')
+    for r, row in enumerate(matrix):
+        top = TICKET_HEIGHT - QR_Y - (r + 1) * module
+        c = 0
+        while c < len(row):
+            if not row[c]:
+                c += 1
+                continue
+            start = c
+            while c < len(row) and row[c]:
+                c += 1
+            ops.append(
+                f'{_fmt(QR_X + start * module)} {_fmt(top)} '
+                f'{_fmt((c - start) * module)} {_fmt(module)} re'
+            )
+    ops.append('f Q')
+    return ops
+
+
+def _cut_mark_ops(layout):
+    """Short hairlines in the margin at every column and row boundary."""
+    offset = CUT_MARK_OFFSET_MM * MM
+    length = CUT_MARK_LENGTH_MM * MM
+    left, bottom = layout.grid_left, layout.grid_bottom
+    right = left + layout.columns * layout.ticket_width
+    top = bottom + layout.rows * layout.ticket_height
+
+    ops = ['q 0.25 w 0 G']
+    for col in range(layout.columns + 1):
+        x = _fmt(left + col * layout.ticket_width)
+        ops.append(f'{x} {_fmt(top + offset)} m {x} {_fmt(top + offset + length)} l')
+        ops.append(f'{x} {_fmt(bottom - offset)} m {x} {_fmt(bottom - offset - length)} l')
+    for row in range(layout.rows + 1):
+        y = _fmt(bottom + row * layout.ticket_height)
+        ops.append(f'{_fmt(left - offset)} {y} m {_fmt(left - offset - length)} {y} l')
+        ops.append(f'{_fmt(right + offset)} {y} m {_fmt(right + offset + length)} {y} l')
+    ops.append('S Q')
+    return ops
+
+
+class _PdfWriter:
+    """
+    Minimal streaming PDF writer: objects are emitted as they are produced and
+    the page tree and cross-reference table are written at the end.
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = 3
+        self.page_ids = []
+
+    def reserve(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def obj(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.offset
+        out = f'{obj_id} 0 obj\n{body}\n'.encode('latin-1')
+        if stream is not None:
+            out += b'stream\n' + stream + b'\nendstream\n'
+        return self.emit(out + b'endobj\n')
+
+    def header(self):
+        return self.emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def trailer(self):
+        out = self.obj(self.CATALOG, f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>')
+        kids = ' '.join(f'{pid} 0 R' for pid in self.page_ids)
+        out += self.obj(self.PAGES, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>')
+
+        xref_at = self.offset
+        lines = [f'xref\n0 {self.next_id}\n', '0000000000 65535 f \n']
+        lines += [f'{self.offsets[i]:010d} 00000 n \n' for i in range(1, self.next_id)]
+        lines.append(f'trailer\n<< /Size {self.next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_at}\n%%EOF\n')
+        return out + self.emit(''.join(lines).encode('latin-1'))
+
+
+def iter_tickets_pdf(ticket_ids, design_config=None, paper='a4', ticket_width_mm=DEFAULT_TICKET_WIDTH_MM):
+    """
+    Yield a print-ready PDF (as byte chunks) with `ticket_ids` laid out N-up.
+    Raises ValueError for an unknown paper size or a ticket that doesn't fit.
+    """
+    layout = SheetLayout(paper, ticket_width_mm)
+    scale = layout.ticket_width / TICKET_WIDTH
+    pdf = _PdfWriter()
+
+    yield pdf.header()
+
+    # Shared resources: the background artwork and a standard font
+    jpeg = BytesIO()
+    render_ticket_background(design_config).save(jpeg, format='JPEG', quality=92)
+    bg_id, font_id, resources_id = pdf.reserve(), pdf.reserve(), pdf.reserve()
+    yield pdf.obj(bg_id, (
+        f'<< /Type /XObject /Subtype /Image /Width {TICKET_WIDTH} /Height {TICKET_HEIGHT} '
+        f'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {jpeg.tell()} >>'
+    ), jpeg.getvalue())
+    yield pdf.obj(font_id, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    yield pdf.obj(resources_id, f'<< /Font << /F1 {font_id} 0 R >> /XObject << /Bg {bg_id} 0 R >> >>')
+
+    cut_marks = _cut_mark_ops(layout)
+    media_box = f'[0 0 {_fmt(layout.page_width)} {_fmt(layout.page_height)}]'
+
+    ticket_ids = list(ticket_ids)
+    for start in range(0, len(ticket_ids), layout.per_page):
+        ops = list(cut_marks)
+        for slot, tid in enumerate(ticket_ids[start:start + layout.per_page]):
+            x, y = layout.slot_origin(slot)
+            ops.extend(_ticket_ops(tid, x, y, scale))
+        content = zlib.compress('\n'.join(ops).encode('latin-1'))
+
+        content_id, page_id = pdf.reserve(), pdf.reserve()
+        pdf.page_ids.append(page_id)
+        yield pdf.obj(content_id, f'<< /Length {len(content)} /Filter /FlateDecode >>', content)
+        yield pdf.obj(page_id, (
+            f'<< /Type /Page /Parent {pdf.PAGES} 0 R /MediaBox {media_box} '
+            f'/Resources {resources_id} 0 R /Contents {content_id} 0 R >>'
+        ))
+
+    yield pdf.trailer()
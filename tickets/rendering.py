@@ -0,0 +1,309 @@
+"""
+Ticket rendering helpers (Pillow, QR codes via qr.py).
+Shared by the HTML views, the JSON API and the background generation jobs.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .qr import qr_image
+
+
+def hex_to_rgb(hex_color):
+    """Convert hex color to RGB tuple"""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+# Ticket dimensions - LANDSCAPE (wider than tall)
+TICKET_WIDTH, TICKET_HEIGHT = 800, 350
+
+# QR code placement – large, centered in the right section for easy scanning
+QR_SIZE = 220
+QR_X = TICKET_WIDTH - QR_SIZE - 20
+QR_Y = (TICKET_HEIGHT - QR_SIZE) // 2
+
+# Ticket ID text placement (bottom left)
+ID_TEXT_X, ID_TEXT_Y = 40, TICKET_HEIGHT - 80
+
+DEFAULT_DESIGN = {
+    'event_name': 'EVENT PASS',
+    'ticket_type': 'entry',
+    'price': 0,
+    'primary_color': '#2563eb',
+    'secondary_color': '#1e40af',
+    'background_style': 'gradient'
+}
+
+# Output encodings, selectable per endpoint (settings) or per request:
+#   png          – lossless RGB PNG at default compression (what tickets always were)
+#   png-fast     – low compression: quickest to encode, for on-screen previews
+#   png-palette  – quantized 128-colour PNG: about half the bytes of `png`
+#   webp         – lossless WebP at the fastest method: small and fast to encode
+ENCODING_PROFILES = {
+    'png': {
+        'format': 'PNG', 'save': {}, 'content_type': 'image/png', 'ext': 'png',
+    },
+    'png-fast': {
+        'format': 'PNG', 'save': {'compress_level': 1}, 'content_type': 'image/png', 'ext': 'png',
+    },
+    'png-palette': {
+        'format': 'PNG', 'save': {}, 'palette': 128, 'content_type': 'image/png', 'ext': 'png',
+    },
+    'webp': {
+        'format': 'WEBP', 'save': {'lossless': True, 'method': 0, 'quality': 0},
+        'content_type': 'image/webp', 'ext': 'webp',
+    },
+}
+DEFAULT_ENCODING = 'png'
+
+# Rendered backgrounds kept per design (most organisers reuse a handful)
+BACKGROUND_CACHE_SIZE = 32
+
+_background_cache = OrderedDict()
+_background_lock = threading.Lock()
+
+
+def get_encoding_profile(name):
+    """Return the ENCODING_PROFILES entry for `name`; raises ValueError if unknown."""
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f'Unknown encoding: {name}')
+    return ENCODING_PROFILES[name]
+
+
+def design_hash(design_config):
+    """Stable short hash of a design config (cache key for rendered artwork)."""
+    canonical = json.dumps(design_config or DEFAULT_DESIGN, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+@lru_cache(maxsize=4)
+def load_fonts(scale=1):
+    """
+    Return (title, subtitle, info, small) fonts for a ticket drawn at
+    1/`scale` size, falling back to Pillow's default font.
+    """
+    try:
+        return tuple(ImageFont.truetype("arial.ttf", size // scale) for size in (48, 28, 20, 14))
+    except:
+        if scale == 1:
+            default = ImageFont.load_default()
+        else:
+            default = ImageFont.load_default(size=10 / scale)
+        return default, default, default, default
+
+
+def render_ticket_background(design_config=None):
+    """
+    Return the part of a ticket that only depends on the design: gradient,
+    decorations, event text and the white panel behind the QR code.
+    The image is cached and shared – callers must .copy() before drawing on it.
+    """
+    # Default design if none provided
+    if not design_config:
+        design_config = DEFAULT_DESIGN
+
+    key = design_hash(design_config)
+    with _background_lock:
+        if key in _background_cache:
+            _background_cache.move_to_end(key)
+            return _background_cache[key]
+
+    img = draw_ticket_background(design_config)
+
+    with _background_lock:
+        _background_cache[key] = img
+        while len(_background_cache) > BACKGROUND_CACHE_SIZE:
+            _background_cache.popitem(last=False)
+    return img
+
+
+def draw_ticket_background(design_config=None, scale=1):
+    """
+    Draw a ticket background (uncached) at 1/`scale` of the full ticket size.
+    Use render_ticket_background for full-size tickets; this is for one-off
+    reduced-size renders such as design previews.
+    """
+    if not design_config:
+        design_config = DEFAULT_DESIGN
+
+    def px(value):
+        """Full-size ticket coordinate at this scale."""
+        return value // scale
+
+    width, height = px(TICKET_WIDTH), px(TICKET_HEIGHT)
+    
+    # Create base image with colored background
+    img = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(img)
+    
+    # Parse colors
+    primary_rgb = hex_to_rgb(design_config['primary_color'])
+    secondary_rgb = hex_to_rgb(design_config['secondary_color'])
+    
+    # Create full background gradient
+    if design_config['background_style'] == 'gradient':
+        for x in range(width):
+            ratio = x / width
+            r = int(primary_rgb[0] * (1 - ratio) + secondary_rgb[0] * ratio)
+            g = int(primary_rgb[1] * (1 - ratio) + secondary_rgb[1] * ratio)
+            b = int(primary_rgb[2] * (1 - ratio) + secondary_rgb[2] * ratio)
+            draw.rectangle([(x, 0), (x + 1, height)], fill=(r, g, b))
+    else:
+        draw.rectangle([(0, 0), (width, height)], fill=primary_rgb)
+    
+    # Add subtle decorative circles pattern (very light). The circles don't
+    # overlap, so one overlay composited once gives the same pixels as one
+    # overlay per circle.
+    overlay = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    overlay_draw = ImageDraw.Draw(overlay)
+    for i in range(0, TICKET_WIDTH, 100):
+        for j in range(0, TICKET_HEIGHT, 100):
+            # Draw semi-transparent circles
+            overlay_draw.ellipse([(px(i - 25), px(j - 25)), (px(i + 25), px(j + 25))], fill=(255, 255, 255, 15))
+    img.paste(overlay, (0, 0), overlay)
+    
+    # Add very subtle diagonal accent lines (minimal)
+    overlay = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    overlay_draw = ImageDraw.Draw(overlay)
+    for i in range(-TICKET_HEIGHT, TICKET_WIDTH, 120):
+        overlay_draw.line([(px(i), 0), (px(i + TICKET_HEIGHT), height)], fill=(255, 255, 255, 8),
+                          width=max(1, px(2)))
+    img.paste(overlay, (0, 0), overlay)
+    
+    title_font, subtitle_font, info_font, small_font = load_fonts(scale)
+    
+    # LEFT SECTION - Event Information
+    left_margin = px(40)
+    
+    # Event name (top left)
+    event_name = design_config['event_name']
+    draw.text((left_margin, px(50)), event_name.upper(), 
+              fill='white', font=title_font)
+    
+    # Ticket type and price (below event name)
+    if design_config['ticket_type'] == 'paid':
+        price_text = f"PAID ENTRY | ₹{design_config['price']}"
+    else:
+        price_text = "FREE ENTRY"
+    
+    draw.text((left_margin, px(120)), price_text, 
+              fill='white', font=subtitle_font)
+    
+    # Admit One text
+    draw.text((left_margin, px(TICKET_HEIGHT - 50)), "ADMIT ONE", 
+              fill='white', font=small_font)
+    
+    # Add white rounded background for QR code
+    qr_bg_padding = 15
+    qr_bg_rect = [
+        px(QR_X - qr_bg_padding),
+        px(QR_Y - qr_bg_padding),
+        px(QR_X + QR_SIZE + qr_bg_padding),
+        px(QR_Y + QR_SIZE + qr_bg_padding)
+    ]
+    draw.rounded_rectangle(qr_bg_rect, radius=px(15), fill='white')
+    
+    # Add "SCAN HERE" text above QR
+    scan_text = "SCAN HERE"
+    bbox = draw.textbbox((0, 0), scan_text, font=small_font)
+    text_width = bbox[2] - bbox[0]
+    draw.text((px(QR_X) + (px(QR_SIZE) - text_width) // 2, px(QR_Y - 25)), 
+              scan_text, fill='white', font=small_font)
+    
+    # Add decorative corner elements
+    corner_size = px(30)
+    edge = max(1, px(5))
+    corner_color = (255, 255, 255, 100)
+    
+    # Top left corner
+    draw.rectangle([(0, 0), (corner_size, edge)], fill=corner_color)
+    draw.rectangle([(0, 0), (edge, corner_size)], fill=corner_color)
+    
+    # Top right corner
+    draw.rectangle([(width - corner_size, 0), (width, edge)], fill=corner_color)
+    draw.rectangle([(width - edge, 0), (width, corner_size)], fill=corner_color)
+    
+    # Bottom left corner
+    draw.rectangle([(0, height - edge), (corner_size, height)], fill=corner_color)
+    draw.rectangle([(0, height - corner_size), (edge, height)], fill=corner_color)
+
+    return img
+
+
+def render_ticket(ticket_id, design_config=None, scale=1):
+    """
+    Generate a classy LANDSCAPE ticket image with custom design using Pillow.
+    Returns the PIL Image object. scale > 1 draws a 1/scale size ticket
+    (previews) without touching the shared background cache.
+    """
+    if scale == 1:
+        img = render_ticket_background(design_config).copy()
+    else:
+        img = draw_ticket_background(design_config, scale)
+    draw = ImageDraw.Draw(img)
+    _, _, info_font, _ = load_fonts(scale)
+    
+    # Ticket ID (bottom left)
+    id_text = f"TICKET ID: {str(ticket_id)[:8].upper()}"
+    draw.text((ID_TEXT_X // scale, ID_TEXT_Y // scale), id_text, 
+              fill='white', font=info_font)
+    
+    # RIGHT SECTION - QR Code, rasterized straight to its final size
+    qr_img = qr_image(ticket_id, QR_SIZE // scale)
+    
+    # Paste QR code
+    img.paste(qr_img, (QR_X // scale, QR_Y // scale))
+    
+    return img
+
+
+def encode_ticket_image(img, profile=DEFAULT_ENCODING):
+    """Encode a rendered ticket with one of ENCODING_PROFILES; returns bytes."""
+    options = get_encoding_profile(profile)
+    if options.get('palette'):
+        img = img.quantize(colors=options['palette'], method=Image.Quantize.FASTOCTREE,
+                           dither=Image.Dither.NONE)
+    buffer = BytesIO()
+    img.save(buffer, format=options['format'], **options['save'])
+    return buffer.getvalue()
+
+
+def generate_ticket_image(ticket_id, design_config=None, profile=DEFAULT_ENCODING):
+    """
+    Render a ticket and encode it for HTML/JSON display.
+    Returns base64 encoded image and PIL Image object.
+    """
+    img = render_ticket(ticket_id, design_config)
+    img_str = base64.b64encode(encode_ticket_image(img, profile)).decode()
+    return img_str, img
+
+
+def write_tickets_zip(fileobj, ticket_ids, design_config=None, progress=None, profile=DEFAULT_ENCODING,
+                      render_slot=None):
+    """
+    Render every ticket in `ticket_ids` and write them as images into a ZIP archive.
+    `fileobj` can be any writable binary file (BytesIO, temp file, ...).
+    `progress`, if given, is called with the number of tickets written so far.
+    `render_slot`, if given, is a context manager factory held around each
+    ticket's rendering (background jobs use it to share the render limit).
+    """
+    ext = get_encoding_profile(profile)['ext']
+    # Entries are stored, not deflated: PNG/WebP data is already compressed
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as zf:
+        for done, tid in enumerate(ticket_ids, start=1):
+            with render_slot() if render_slot else nullcontext():
+                data = encode_ticket_image(render_ticket(tid, design_config), profile)
+            zf.writestr(f'ticket_{str(tid)[:8]}.{ext}', data)
+            if progress:
+                progress(done)
+    return fileobj
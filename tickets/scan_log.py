@@ -0,0 +1,159 @@
+"""
+Append-only scan event log with per-gate, per-minute rollups.
+
+validate_ticket_api records every verdict here. Events are buffered in memory
+and written by a background thread in batches, so the gate never waits on the
+log. Each batch is appended to the capped `scan_events` collection and folded
+into `scan_rollups` (one counter document per gate per minute), so throughput
+queries read a few rollup documents instead of scanning events. Rollups older
+than SCAN_ROLLUP_TTL_DAYS are removed by a TTL index.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid
+
+from .mongodb_utils import get_mongo_db, get_scan_events_collection, get_scan_rollups_collection
+
+logger = logging.getLogger(__name__)
+
+VERDICTS = ('granted', 'already_used', 'wrong_event', 'invalid')
+
+_queue = queue.Queue(maxsize=settings.SCAN_LOG_MAX_BUFFER)
+_pending = threading.Event()
+_flusher = None
+_flusher_lock = threading.Lock()
+_collections_ready = False
+
+# Events dropped because the buffer was full (Mongo down or too slow)
+dropped_events = 0
+
+
+def record_scan(code, gate_id, verdict, latency_ms):
+    """Queue one scan event; never blocks the request."""
+    global dropped_events
+    if not settings.SCAN_LOG_ENABLED:
+        return
+    try:
+        _queue.put_nowait({
+            'code':       code,
+            'gate_id':    gate_id,
+            'verdict':    verdict,
+            'latency_ms': round(latency_ms, 2),
+            'at':         datetime.utcnow(),
+        })
+    except queue.Full:
+        dropped_events += 1
+        return
+    _pending.set()
+    _ensure_flusher()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name='scan-log', daemon=True)
+                _flusher.start()
+                atexit.register(flush)
+
+
+def _flush_loop():
+    while True:
+        # Wake up on the first event, then give the batch time to fill
+        _pending.wait()
+        time.sleep(settings.SCAN_LOG_FLUSH_SECONDS)
+        _pending.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Failed to write scan events')
+
+
+def _drain():
+    events = []
+    while True:
+        try:
+            events.append(_queue.get_nowait())
+        except queue.Empty:
+            return events
+
+
+def _ensure_collections():
+    """Create the capped event collection and rollup index once per process."""
+    global _collections_ready
+    if _collections_ready:
+        return
+    try:
+        get_mongo_db().create_collection(
+            'scan_events', capped=True, size=settings.SCAN_LOG_CAPPED_MB * 1024 * 1024,
+        )
+    except CollectionInvalid:
+        pass  # already exists
+    rollups = get_scan_rollups_collection()
+    rollups.create_index([('minute', ASCENDING), ('gate_id', ASCENDING)], unique=True)
+    rollups.create_index('minute', expireAfterSeconds=int(settings.SCAN_ROLLUP_TTL_DAYS * 86400))
+    _collections_ready = True
+
+
+def flush():
+    """Write all buffered events and their rollup increments. Returns the event count."""
+    events = _drain()
+    if not events:
+        return 0
+    _ensure_collections()
+
+    for start in range(0, len(events), settings.SCAN_LOG_BATCH_SIZE):
+        get_scan_events_collection().insert_many(
+            events[start:start + settings.SCAN_LOG_BATCH_SIZE], ordered=False,
+        )
+
+    # One $inc per (gate, minute) in this batch, however many scans it holds
+    rollups = defaultdict(lambda: defaultdict(float))
+    for event in events:
+        minute = event['at'].replace(second=0, microsecond=0)
+        counters = rollups[(event['gate_id'], minute)]
+        counters[event['verdict']] += 1
+        counters['total'] += 1
+        counters['latency_ms_sum'] += event['latency_ms']
+
+    get_scan_rollups_collection().bulk_write([
+        UpdateOne(
+            {'gate_id': gate_id, 'minute': minute},
+            {'$inc': dict(counters)},
+            upsert=True,
+        )
+        for (gate_id, minute), counters in rollups.items()
+    ], ordered=False)
+    return len(events)
+
+
+def gate_throughput(minutes=30, gate_id=None):
+    """
+    Per-gate, per-minute scan counts for the last `minutes` minutes,
+    read from the rollups: {gate_id: [{'minute', 'total', verdicts..., 'avg_latency_ms'}]}.
+    """
+    since = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=minutes)
+    query = {'minute': {'$gte': since}}
+    if gate_id:
+        query['gate_id'] = gate_id
+
+    gates = defaultdict(list)
+    for doc in get_scan_rollups_collection().find(query, {'_id': 0}).sort('minute', ASCENDING):
+        total = int(doc.get('total', 0))
+        gates[doc['gate_id']].append({
+            'minute': doc['minute'].isoformat(),
+            'total':  total,
+            **{verdict: int(doc.get(verdict, 0)) for verdict in VERDICTS},
+            'avg_latency_ms': round(doc.get('latency_ms_sum', 0) / total, 2) if total else None,
+        })
+    return dict(gates)
@@ -0,0 +1,83 @@
+"""
+Conditional-GET support for the dashboard stats.
+
+Ticket creation, validation and archival bump a change sequence number
+(mongodb_utils.bump_ticket_change_seq) – once per write batch, for the events
+touched and for the all-events view. The dashboards derive their ETag from
+the number for the event they show, so a poller whose stats haven't changed
+gets 304 after a single find_one, without counting anything. When they have
+changed, each stats group (an event's totals, or one event/creator's
+per-batch breakdown) is computed once per process per sequence number:
+concurrent pollers wait for that one computation and share its result.
+"""
+
+import threading
+from collections import OrderedDict
+
+from .mongodb_utils import get_group_stats, get_ticket_stats
+
+# Stats groups kept in memory per process
+CACHE_SIZE = 256
+
+_cache = OrderedDict()   # group key -> (seq, stats)
+_in_flight = {}          # (group key, seq) -> _Flight
+_lock = threading.Lock()
+
+
+class _Flight:
+    """One stats computation that other requests can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.stats = None
+        self.error = None
+
+
+def stats_etag(event_id, seq, *parts):
+    """ETag (quoted) for an event's stats at change sequence `seq`."""
+    return '"' + '-'.join(['stats', event_id or 'all', str(seq), *parts]) + '"'
+
+
+def _cached(key, seq, compute):
+    """compute(), at most once per group key and change sequence number."""
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[0] >= seq:
+            _cache.move_to_end(key)
+            return cached[1]
+        flight = _in_flight.get((key, seq))
+        owner = flight is None
+        if owner:
+            flight = _in_flight[(key, seq)] = _Flight()
+
+    if not owner:
+        flight.done.wait()
+        if flight.error:
+            raise flight.error
+        return flight.stats
+
+    try:
+        flight.stats = compute()
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _lock:
+            del _in_flight[(key, seq)]
+            if flight.error is None:
+                _cache[key] = (seq, flight.stats)
+                _cache.move_to_end(key)
+                while len(_cache) > CACHE_SIZE:
+                    _cache.popitem(last=False)
+        flight.done.set()
+    return flight.stats
+
+
+def cached_ticket_stats(event_id, seq):
+    """get_ticket_stats(event_id) for change sequence number `seq`."""
+    return _cached(('totals', event_id), seq, lambda: get_ticket_stats(event_id))
+
+
+def cached_group_stats(event_id, created_by, seq):
+    """get_group_stats(event_id, created_by) for change sequence number `seq`."""
+    return _cached(('groups', event_id, created_by), seq, lambda: get_group_stats(event_id, created_by))
@@ -1,3 +1,890 @@
-from django.test import TestCase
+"""
+Tests for the tickets app:  python manage.py test tickets
 
-# Create your tests here.
+MongoDB-backed tests run against mongomock, an in-memory MongoDB stand-in
+(pip install mongomock); they are skipped when it isn't installed.
+"""
+
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import admission, archive, idempotency, jobs, mongodb_utils, scan_log, stats_cache, warm_pool
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+try:
+    import cv2
+    import numpy
+except ImportError:
+    cv2 = None
+
+
+@skipUnless(mongomock, 'mongomock is not installed')
+@override_settings(SCAN_LOG_ENABLED=False)
+class MongoTestCase(TestCase):
+    """Points tickets.mongodb_utils at a fresh in-memory database for each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.patch(mongodb_utils, '_client', mongomock.MongoClient())
+        self.patch(mongodb_utils, '_ticket_indexes_ready', False)
+
+    def patch(self, target, attribute, value):
+        patcher = mock.patch.object(target, attribute, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tickets(self):
+        return mongodb_utils.get_tickets_collection()
+
+
+class FakeGridFSBucket:
+    """The part of GridFSBucket the app uses (mongomock's GridFS lags behind pymongo)."""
+
+    def __init__(self):
+        self.files = {}
+
+    def upload_from_stream(self, filename, source, metadata=None):
+        file_id = len(self.files) + 1
+        self.files[file_id] = source.read()
+        return file_id
+
+    def open_download_stream(self, file_id):
+        stream = BytesIO(self.files[file_id])
+        stream.length = len(self.files[file_id])
+        return stream
+
+
+class ImportFileTestCase(MongoTestCase):
+    """Writes three attendee IDs to a temporary file for import_tickets."""
+
+    def setUp(self):
+        super().setUp()
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, 'attendees.txt')
+        with open(self.path, 'w') as f:
+            f.write('AAAA1111\nBBBB2222\nCCCC3333\n')
+
+    def import_file(self, *args):
+        out = StringIO()
+        call_command('import_tickets', self.path, '--event', 'fest', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+
+class ImportTicketsTests(ImportFileTestCase):
+
+    def test_reimport_skips_duplicates(self):
+        self.import_file()
+        report = self.import_file('--restart')
+
+        self.assertIn('Imported 0 tickets (3 duplicates skipped)', report)
+        self.assertEqual(self.tickets().count_documents({'event_id': 'fest'}), 3)
+        self.assertEqual(self.tickets().count_documents({'ticket_id': 'AAAA1111'}), 1)
+
+    def test_repeated_id_in_one_file_is_imported_once(self):
+        with open(self.path, 'a') as f:
+            f.write('AAAA1111\n')
+        self.import_file()
+
+        self.assertEqual(self.tickets().count_documents({'ticket_id': 'AAAA1111'}), 1)
+
+    def test_reimported_ticket_admits_only_once(self):
+        self.import_file()
+        self.import_file('--restart')
+
+        verdicts = [
+            self.client.post('/api/validate/', {'code': 'AAAA1111', 'event': 'fest'}).json()['status']
+            for _ in range(2)
+        ]
+        self.assertEqual(verdicts, ['success', 'error'])
+
+    def test_malformed_event_is_rejected(self):
+        with self.assertRaisesMessage(CommandError, 'Invalid event ID'):
+            self.import_file('--event', '{"$ne": 1}')
+
+        self.assertEqual(self.tickets().count_documents({}), 0)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+
+class TicketUniquenessTests(ImportFileTestCase):
+    """One document per ticket ID, whatever event it was imported into."""
+
+    def scan_twice(self, code, event=None):
+        data = {'code': code, **({'event': event} if event else {})}
+        return [self.client.post('/api/validate/', data).json()['status'] for _ in range(2)]
+
+    def test_legacy_ticket_reimported_into_default_event_admits_once(self):
+        self.tickets().insert_one({'ticket_id': 'AAAA1111', 'is_used': False})  # predates events
+        report = StringIO()
+        call_command('import_tickets', self.path, stdout=report, stderr=StringIO())
+
+        self.assertIn('(1 duplicates skipped)', report.getvalue())
+        self.assertEqual(self.scan_twice('AAAA1111', event='default'), ['success', 'error'])
+
+    def test_same_id_in_two_events_admits_once(self):
+        self.import_file()
+        report = StringIO()
+        call_command('import_tickets', self.path, '--event', 'expo', '--restart', stdout=report, stderr=StringIO())
+
+        self.assertIn('Imported 0 tickets (3 duplicates skipped)', report.getvalue())
+        self.assertEqual(self.scan_twice('AAAA1111'), ['success', 'error'])
+
+    def test_index_upgrade_waits_for_dedupe(self):
+        tickets = mongodb_utils.get_mongo_db()['tickets']
+        tickets.create_index('ticket_id')  # pre-unique database with a duplicate
+        tickets.insert_many([{'ticket_id': 'AAAA1111', 'is_used': True}, {'ticket_id': 'AAAA1111', 'is_used': False}])
+
+        with mock.patch.object(tickets, 'drop_index') as drop_index, self.assertLogs(mongodb_utils.logger):
+            mongodb_utils.ensure_ticket_indexes(tickets)  # request path: never rebuilds
+        drop_index.assert_not_called()
+
+        call_command('dedupe_tickets', stderr=StringIO())
+        self.assertEqual(list(tickets.find({'ticket_id': 'AAAA1111'}, {'_id': 0, 'is_used': 1})), [{'is_used': True}])
+        self.assertTrue(tickets.index_information()['ticket_id_1'].get('unique'))
+
+class PrintSheetTests(SimpleTestCase):
+
+    def test_non_latin_ids_still_give_a_complete_pdf(self):
+        from .print_sheets import iter_tickets_pdf
+
+        pdf = b''.join(iter_tickets_pdf(['ÄBC12345', '票券12345678', 'plain-id']))
+
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+
+    def test_ticket_width_must_be_positive_and_finite(self):
+        from .print_sheets import SheetLayout
+
+        for width in (0, -10, float('nan'), float('inf'), '80'):
+            with self.subTest(width=width), self.assertRaises(ValueError):
+                SheetLayout('a4', width)
+
+class DesignPreviewTests(SimpleTestCase):
+
+    def preview(self, design, **headers):
+        return self.client.post('/api/design/preview/?scale=4', json.dumps(design),
+                                content_type='application/json', **headers)
+
+    def test_bad_designs_are_rejected(self):
+        for design in ([1, 2], {'primary_color': 5}, {'event_name': 5}, {'primary_color': '#zz'}):
+            with self.subTest(design=design):
+                self.assertEqual(self.preview(design).status_code, 400)
+
+    def test_preview_is_drawn_small_and_revalidated_by_etag(self):
+        from PIL import Image
+
+        response = self.preview({'primary_color': '#ff0000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Image.open(BytesIO(response.content)).size, (200, 87))
+
+        again = self.preview({'primary_color': '#ff0000'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+@override_settings(ADMISSION_CONTROL_ENABLED=True, WEB_THREADS=4)
+class AdmissionThreadBudgetTests(SimpleTestCase):
+    """Drives the middleware from a pool the size of one gunicorn worker's threads."""
+
+    def setUp(self):
+        self.renders_may_finish = threading.Event()
+        self.addCleanup(self.renders_may_finish.set)
+        render = admission.AdmissionClass('render', limit=2, queue_size=1, timeout=30)
+        patcher = mock.patch.dict(admission.CLASSES, {'render': render, 'validate': admission.AdmissionClass('validate')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.middleware = admission.AdmissionControlMiddleware(self.view)
+
+    def view(self, request):
+        if request.path == '/api/generate/':
+            self.renders_may_finish.wait(30)
+        return JsonResponse({'status': 'success'})
+
+    def test_validate_gets_a_thread_while_renders_are_saturated(self):
+        factory = RequestFactory()
+        with ThreadPoolExecutor(max_workers=4) as threads:
+            renders = [threads.submit(self.middleware, factory.post('/api/generate/')) for _ in range(10)]
+            validate = threads.submit(self.middleware, factory.post('/api/validate/'))
+
+            # Renders are still blocked: validation must not be waiting on them
+            self.assertEqual(validate.result(timeout=5).status_code, 200)
+            shed = [f.result(timeout=5).status_code for f in renders if f.done()]
+            self.assertEqual(shed, [429] * 7)
+
+            self.renders_may_finish.set()
+            statuses = sorted(f.result(timeout=5).status_code for f in renders)
+        self.assertEqual(statuses, [200] * 3 + [429] * 7)
+
+    @override_settings(WEB_THREADS=3)
+    def test_refuses_to_start_when_renders_could_take_every_thread(self):
+        with self.assertRaises(ImproperlyConfigured):
+            admission.AdmissionControlMiddleware(self.view)
+
+
+@override_settings(WARM_POOL_ENABLED=True, WARM_POOL_SIZE=3, WARM_POOL_IDLE_SECONDS=30)
+class WarmPoolRefillTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.render = admission.AdmissionClass('render', limit=1)
+        self.patch(admission, 'CLASSES', {'render': self.render, 'validate': admission.AdmissionClass('validate')})
+        warm_pool.record_design_use('abc', {}, 'png', 0, 0)
+
+    def test_refill_skipped_while_requests_are_recent(self):
+        self.render.acquire()
+        self.render.release()
+        with mock.patch.object(warm_pool.threading, 'Thread') as thread:
+            warm_pool.schedule_refill()
+        thread.assert_not_called()
+
+    def test_fill_stops_when_render_slots_are_taken(self):
+        self.render.acquire()
+        self.assertEqual(warm_pool.fill_pool(), 0)
+        self.render.release()
+        self.assertEqual(warm_pool.fill_pool(), 3)
+
+    def test_design_that_fails_to_render_is_not_remembered(self):
+        response = self.client.post('/api/generate/', json.dumps({'count': 2, 'design': {'event_name': 'X'}}),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.tickets().count_documents({}), 0)
+        designs = mongodb_utils.get_pool_designs_collection()
+        self.assertEqual([doc['design_hash'] for doc in designs.find()], ['abc'])
+
+    def test_broken_design_is_evicted_without_stopping_the_refill(self):
+        warm_pool.record_design_use('broken', {'event_name': 'X'}, 'png', 0, 0)  # most recent: filled first
+
+        with self.assertLogs(warm_pool.logger):
+            self.assertEqual(warm_pool.fill_pool(), 3)
+        designs = mongodb_utils.get_pool_designs_collection()
+        self.assertEqual([doc['design_hash'] for doc in designs.find()], ['abc'])
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+class IdempotencyTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.patch(idempotency, 'get_gridfs_bucket', lambda bucket=FakeGridFSBucket(): bucket)
+        self.runs = 0
+
+        @idempotency.idempotent
+        def view(request):
+            self.runs += 1
+            return JsonResponse({'run': self.runs})
+        self.view = view
+
+    def post(self, body=b'{}', key='0b6e1c5a-first-key', user_id='u1'):
+        request = RequestFactory().post('/api/generate/', body, content_type='application/json',
+                                        HTTP_IDEMPOTENCY_KEY=key)
+        request.session = SessionStore()
+        if user_id:
+            request.session['user_id'] = user_id
+        response = self.view(request)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_retry_replays_the_first_response(self):
+        _, first = self.post()
+        response, replayed = self.post()
+
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(replayed, first)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_with_a_different_body_is_rejected(self):
+        self.post()
+        response, _ = self.post(body=b'{"count": 2}')
+        self.assertEqual(response.status_code, 422)
+
+    def test_same_key_from_another_user_runs_separately(self):
+        _, first = self.post(user_id='u1')
+        response, second = self.post(user_id='u2')
+
+        self.assertEqual(self.runs, 2)
+        self.assertNotEqual(second, first)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_sessionless_callers_are_scoped_by_creator(self):
+        # Cross-origin calls behind one proxy: same address, no session
+        self.post(body=b'{"count": 5, "created_by": "alice"}', user_id=None)
+        response, _ = self.post(body=b'{"count": 5, "created_by": "bob"}', user_id=None)
+
+        self.assertEqual(self.runs, 2)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_short_keys_are_rejected(self):
+        response, _ = self.post(key='1')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.runs, 0)
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=0, WARM_POOL_ENABLED=False)
+class ResumedGenerationTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.patch(idempotency, 'get_gridfs_bucket', lambda bucket=FakeGridFSBucket(): bucket)
+
+    def generate(self, lines=None):
+        """Stream api_generate for 4 tickets; stop after `lines` NDJSON lines, like a dropped connection."""
+        response = self.client.post(
+            '/api/generate/', json.dumps({'count': 4, 'stream': True}),
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY='3d9f0a7e-retry-me',
+        )
+        if lines is None:
+            return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        received = []
+        for chunk in response.streaming_content:  # one line per chunk while generating
+            received.append(json.loads(chunk))
+            if len(received) == lines:
+                break
+        response.close()
+        return received
+
+    def test_retry_after_cut_off_stream_finishes_the_same_batch(self):
+        first = self.generate(lines=3)  # batch line and two tickets
+        retry = self.generate()
+
+        batch_id = first[0]['batch_id']
+        self.assertEqual(retry[0]['batch_id'], batch_id)
+        delivered = [line['id'] for line in retry if line['type'] == 'ticket']
+        self.assertEqual(delivered[:2], [line['id'] for line in first[1:]])
+        self.assertEqual(retry[-1], {'type': 'done', 'count': 4})
+        self.assertEqual(self.tickets().count_documents({}), 4)
+        self.assertEqual(self.tickets().count_documents({'batch_id': batch_id}), 4)
+
+    def test_completed_stream_is_replayed(self):
+        first = self.generate()
+        replay = self.generate()
+
+        self.assertEqual(replay, first)
+        self.assertEqual(self.tickets().count_documents({}), 4)
+
+
+@override_settings(WARM_POOL_ENABLED=False)
+class ChangeSequenceTests(MongoTestCase):
+
+    def test_generated_batch_bumps_its_event_once(self):
+        self.client.post('/api/generate/', json.dumps({'count': 3, 'event_id': 'fest'}),
+                         content_type='application/json')
+
+        self.assertEqual(mongodb_utils.ticket_change_seq('fest'), 1)
+        self.assertEqual(mongodb_utils.ticket_change_seq(), 1)
+
+    def test_validation_leaves_other_events_cached(self):
+        self.tickets().insert_one({'ticket_id': 'AAAA1111', 'event_id': 'fest', 'is_used': False})
+        self.client.post('/api/validate/', {'code': 'AAAA1111'})
+
+        self.assertEqual(mongodb_utils.ticket_change_seq('fest'), 1)
+        self.assertEqual(mongodb_utils.ticket_change_seq('expo'), 0)
+        self.assertEqual(mongodb_utils.ticket_change_seq(), 1)
+
+
+@override_settings(TICKET_QR_ERROR_CORRECTION='H')
+class TicketRenderingTests(SimpleTestCase):
+    """The fast QR path must draw exactly what the qrcode-library renderer did."""
+
+    TICKET_IDS = ('3f2b8c1e-9d4a-4e6f-b1c2-7a8d9e0f1a2b', 'MZXW6YTBOI2DGNBVGY3TQOJQ')
+
+    def setUp(self):
+        from .rendering import DEFAULT_DESIGN
+        self.design = {**DEFAULT_DESIGN, 'primary_color': '#1a2b3c', 'event_name': 'Tech Fest'}
+
+    @staticmethod
+    def baseline_ticket(ticket_id, design_config):
+        """Ticket as rendered before tickets/qr.py (make(fit=True), box_size=10, scaled down)."""
+        import qrcode
+        from PIL import ImageDraw
+        from .rendering import ID_TEXT_X, ID_TEXT_Y, QR_SIZE, QR_X, QR_Y, load_fonts, render_ticket_background
+
+        img = render_ticket_background(design_config).copy()
+        draw = ImageDraw.Draw(img)
+        draw.text((ID_TEXT_X, ID_TEXT_Y), f"TICKET ID: {str(ticket_id)[:8].upper()}",
+                  fill='white', font=load_fonts()[2])
+        qr = qrcode.QRCode(box_size=10, border=3, error_correction=qrcode.constants.ERROR_CORRECT_H)
+        qr.add_data(str(ticket_id))
+        qr.make(fit=True)
+        img.paste(qr.make_image(fill_color='black', back_color='white').resize((QR_SIZE, QR_SIZE), resample=0),
+                  (QR_X, QR_Y))
+        return img
+
+    def test_matches_baseline_renderer(self):
+        from .rendering import render_ticket
+
+        for ticket_id in self.TICKET_IDS:
+            with self.subTest(ticket_id=ticket_id):
+                expected = self.baseline_ticket(ticket_id, self.design)
+                self.assertEqual(render_ticket(ticket_id, self.design).tobytes(), expected.tobytes())
+
+    @skipUnless(cv2, 'opencv-python is not installed')
+    def test_qr_decodes_to_ticket_id(self):
+        from .rendering import render_ticket
+
+        for ticket_id in self.TICKET_IDS:
+            with self.subTest(ticket_id=ticket_id):
+                pixels = numpy.array(render_ticket(ticket_id, self.design).convert('RGB'))
+                decoded, _, _ = cv2.QRCodeDetector().detectAndDecode(pixels)
+                self.assertEqual(decoded, ticket_id)
+
+
+@override_settings(TICKET_JOB_STALE_SECONDS=60)
+class ClaimJobTests(MongoTestCase):
+
+    def add_job(self, **fields):
+        from datetime import datetime
+        job = {'job_id': 'j1', 'status': 'queued', 'attempts': 0, 'heartbeat_at': datetime.utcnow(), **fields}
+        jobs.get_jobs_collection().insert_one(job)
+
+    def test_only_one_concurrent_claim_wins(self):
+        self.add_job()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            claims = list(pool.map(lambda _: jobs._claim_job('j1'), range(8)))
+
+        self.assertEqual(sum(claim is not None for claim in claims), 1)
+
+    def test_running_job_is_not_claimed_until_stale(self):
+        from datetime import datetime, timedelta
+        self.add_job(status='running', attempts=1)
+        self.assertIsNone(jobs._claim_job('j1'))
+
+        jobs.get_jobs_collection().update_one(
+            {'job_id': 'j1'}, {'$set': {'heartbeat_at': datetime.utcnow() - timedelta(seconds=120)}},
+        )
+        claim = jobs._claim_job('j1')
+        self.assertEqual((claim['status'], claim['attempts']), ('running', 2))
+
+    def test_finished_job_is_never_claimed(self):
+        from datetime import datetime, timedelta
+        self.add_job(status='done', attempts=1, heartbeat_at=datetime.utcnow() - timedelta(days=1))
+        self.assertIsNone(jobs._claim_job('j1'))
+
+
+
+class GenerationJobTests(MongoTestCase):
+
+    def test_invalid_design_is_rejected_before_any_ticket_exists(self):
+        with mock.patch.object(jobs, 'submit_generation_job') as submit:
+            response = self.client.post('/api/jobs/', json.dumps({'count': 30, 'design': {'event_name': 'X'}}),
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        submit.assert_not_called()
+
+    def test_failed_job_leaves_no_tickets(self):
+        with mock.patch.object(jobs, '_get_executor'):
+            job_id = jobs.submit_generation_job(30, event_id='fest')
+        with mock.patch('tickets.rendering.write_tickets_zip', side_effect=OSError('disk full')):
+            jobs.run_generation_job(job_id)
+
+        self.assertEqual(jobs.get_jobs_collection().find_one({'job_id': job_id})['status'], 'failed')
+        self.assertEqual(self.tickets().count_documents({'batch_id': job_id}), 0)
+
+
+
+@override_settings(SCAN_LOG_ENABLED=True)
+class ScanLogTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        from pymongo.errors import CollectionInvalid
+        # mongomock can't create capped collections; scan_events is plain here
+        self.patch(scan_log, 'get_mongo_db', lambda: mock.Mock(**{'create_collection.side_effect': CollectionInvalid}))
+        self.patch(scan_log, '_collections_ready', False)
+        self.patch(scan_log, '_ensure_flusher', lambda: None)  # flushed explicitly below
+        scan_log._drain()
+        self.tickets().insert_many([{'ticket_id': code, 'is_used': False} for code in ('AAAA1111', 'BBBB2222')])
+
+    def scan(self, code, gate):
+        return self.client.post('/api/validate/', json.dumps({'code': code, 'gate': gate}),
+                                content_type='application/json')
+
+    def throughput(self):
+        scan_log.flush()
+        return self.client.get('/api/gates/throughput/').json()['gates']
+
+    def test_rollups_count_verdicts_per_gate(self):
+        self.scan('AAAA1111', 'north')
+        self.scan('AAAA1111', 'north')
+        self.scan('ZZZZ9999', 'south')
+
+        gates = self.throughput()
+        self.assertEqual(sorted(gates), ['north', 'south'])
+        self.assertEqual((gates['north'][0]['granted'], gates['north'][0]['already_used']), (1, 1))
+        self.assertEqual(gates['south'][0]['invalid'], 1)
+
+    def test_non_string_gate_does_not_lose_the_batch(self):
+        self.scan('AAAA1111', {'name': 'north'})
+        self.scan('BBBB2222', 'south')
+
+        self.assertEqual(sorted(self.throughput()), ['south', "{'name': 'north'}"])
+
+    def test_non_string_code_is_rejected(self):
+        response = self.scan({'$ne': None}, 'north')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.tickets().count_documents({'is_used': True}), 0)
+
+    def test_rollups_expire(self):
+        self.scan('AAAA1111', 'north')
+        scan_log.flush()
+
+        ttl = [info for info in mongodb_utils.get_scan_rollups_collection().index_information().values()
+               if 'expireAfterSeconds' in info]
+        self.assertEqual([info['key'] for info in ttl], [[('minute', 1)]])
+
+
+class AdmissionClassTests(SimpleTestCase):
+
+    def test_sheds_beyond_limit_and_queue(self):
+        render = admission.AdmissionClass('render', limit=1, queue_size=0)
+
+        self.assertTrue(render.acquire())
+        self.assertFalse(render.acquire())
+        self.assertEqual(render.stats()['shed'], 1)
+
+    def test_queued_request_gets_the_released_slot(self):
+        render = admission.AdmissionClass('render', limit=1, queue_size=1, timeout=5)
+        render.acquire()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            waiter = pool.submit(render.acquire)
+            while render.stats()['queued'] == 0:
+                time.sleep(0.01)
+            render.release()
+            self.assertTrue(waiter.result(timeout=5))
+        self.assertEqual(render.stats()['active'], 1)
+
+    def test_queued_request_is_shed_after_timeout(self):
+        render = admission.AdmissionClass('render', limit=1, queue_size=1, timeout=0.05)
+        render.acquire()
+
+        self.assertFalse(render.acquire())
+        self.assertEqual(render.stats()['shed'], 1)
+        self.assertEqual(render.stats()['queued'], 0)
+
+    def test_try_acquire_never_waits(self):
+        render = admission.AdmissionClass('render', limit=1, queue_size=1, timeout=5)
+
+        self.assertTrue(render.try_acquire())
+        self.assertFalse(render.try_acquire())
+
+
+
+class JobRenderSlotTests(MongoTestCase):
+
+    def test_job_renders_only_in_free_render_slots(self):
+        render = admission.AdmissionClass('render', limit=1)
+        self.patch(admission, 'CLASSES', {'render': render, 'validate': admission.AdmissionClass('validate')})
+        self.patch(jobs, 'get_gridfs_bucket', lambda bucket=FakeGridFSBucket(): bucket)
+        with mock.patch.object(jobs, '_get_executor'):
+            job_id = jobs.submit_generation_job(2)
+
+        render.acquire()  # a request is rendering
+        worker = threading.Thread(target=jobs.run_generation_job, args=(job_id,))
+        worker.start()
+        time.sleep(0.3)
+        self.assertEqual(jobs.get_jobs_collection().find_one({'job_id': job_id})['status'], 'running')
+        self.assertEqual(render.stats()['admitted'], 1)
+
+        render.release()
+        worker.join(timeout=10)
+        self.assertEqual(jobs.get_jobs_collection().find_one({'job_id': job_id})['status'], 'done')
+        self.assertEqual(render.stats()['admitted'], 3)
+        self.assertEqual(render.stats()['active'], 0)
+
+
+
+class GroupStatsTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tickets().insert_many([
+            {'ticket_id': f'{batch}{n}', 'event_id': event, 'batch_id': batch, 'created_by': creator,
+             'is_used': n < used}
+            for event, batch, creator, count, used in (
+                ('fest', 'b1', 'alice', 3, 1),
+                ('fest', 'b2', 'bob', 2, 2),
+                ('expo', 'b3', 'alice', 4, 0),
+            )
+            for n in range(count)
+        ])
+
+    def test_counts_per_batch_and_creator(self):
+        stats = mongodb_utils.get_group_stats('fest')
+
+        self.assertEqual(
+            [(row['batch_id'], row['total'], row['used'], row['available']) for row in stats['batches']],
+            [('b1', 3, 1, 2), ('b2', 2, 2, 0)],
+        )
+        self.assertEqual(
+            [(row['created_by'], row['total'], row['batches']) for row in stats['creators']],
+            [('alice', 3, 1), ('bob', 2, 1)],
+        )
+
+    def test_one_creator_across_events(self):
+        stats = mongodb_utils.get_group_stats(created_by='alice')
+
+        self.assertEqual([row['batch_id'] for row in stats['batches']], ['b3', 'b1'])
+        self.assertEqual(stats['creators'], [
+            {'created_by': 'alice', 'total': 7, 'used': 1, 'archived': 0, 'batches': 2, 'available': 6},
+        ])
+
+    def test_archived_tickets_are_merged_into_their_batch(self):
+        archive.archive_tickets({'ticket_id': {'$in': ['b10', 'b11']}})
+
+        b1 = mongodb_utils.get_group_stats('fest', 'alice')['batches']
+        self.assertEqual(b1, [{'batch_id': 'b1', 'created_by': 'alice', 'total': 3, 'used': 1,
+                               'archived': 2, 'available': 2}])
+
+    def test_creator_led_index_exists(self):
+        keys = [info['key'] for info in self.tickets().index_information().values()]
+        self.assertIn([('created_by', 1), ('batch_id', 1), ('is_used', 1)], keys)
+
+
+class ArchiveTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.patch(archive, '_indexes_ready', False)
+        self.tickets().insert_many([
+            {'ticket_id': f'T{n}', 'event_id': event, 'batch_id': f'{event}-b', 'created_by': 'alice',
+             'is_used': n % 2 == 0}
+            for n, event in enumerate(['fest'] * 4 + ['expo'] * 2)
+        ])
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, 'fest.ndjson.gz')
+
+    def ticket_ids(self, collection=None):
+        return sorted(doc['ticket_id'] for doc in (collection or self.tickets()).find())
+
+    def test_collection_round_trip(self):
+        moved = archive.archive_tickets(archive.archive_query('fest'), batch_size=3)
+
+        self.assertEqual(moved, 4)
+        self.assertEqual(self.ticket_ids(), ['T4', 'T5'])
+        self.assertEqual(self.ticket_ids(mongodb_utils.get_archive_collection()), ['T0', 'T1', 'T2', 'T3'])
+
+        self.assertEqual(archive.restore_tickets('fest'), 4)
+        self.assertEqual(self.ticket_ids(), ['T0', 'T1', 'T2', 'T3', 'T4', 'T5'])
+        self.assertEqual(mongodb_utils.get_archive_collection().count_documents({}), 0)
+        self.assertEqual(archive.archived_summaries(), [])
+
+    def test_file_round_trip(self):
+        archive.archive_tickets(archive.archive_query('fest'), path=self.path)
+
+        self.assertEqual(self.ticket_ids(), ['T4', 'T5'])
+        self.assertEqual(mongodb_utils.get_archive_collection().count_documents({}), 0)
+        [summary] = archive.archived_summaries('fest')
+        self.assertEqual(summary['locations'], [f'file:{self.path}'])
+
+        self.assertEqual(archive.restore_tickets(path=self.path), 4)
+        restored = self.tickets().find_one({'ticket_id': 'T2'})
+        self.assertEqual((restored['event_id'], restored['batch_id'], restored['is_used']), ('fest', 'fest-b', True))
+        self.assertEqual(archive.archived_stats('fest'), {'total': 0, 'used': 0})
+
+    def test_restoring_a_file_twice_is_harmless(self):
+        archive.archive_tickets(archive.archive_query('fest'), path=self.path)
+
+        self.assertEqual(archive.restore_tickets(path=self.path, batch_size=3), 4)
+        self.assertEqual(archive.restore_tickets(path=self.path, batch_size=3), 0)
+        self.assertEqual(self.tickets().count_documents({'event_id': 'fest'}), 4)
+        self.assertEqual(archive.archived_stats(), {'total': 0, 'used': 0})
+
+    def test_stats_include_archived_tickets(self):
+        before = mongodb_utils.get_ticket_stats('fest')
+        archive.archive_tickets(archive.archive_query('fest', batch_id='fest-b'))
+
+        self.assertEqual(archive.archived_stats('fest'), {'total': 4, 'used': 2})
+        self.assertEqual(archive.archived_stats('expo'), {'total': 0, 'used': 0})
+        self.assertEqual(mongodb_utils.get_ticket_stats('fest'), {**before, 'archived': 4})
+        self.assertEqual(mongodb_utils.get_ticket_stats(), {'total': 6, 'used': 3, 'available': 3, 'archived': 4})
+
+    def test_refuses_to_archive_everything(self):
+        with self.assertRaises(ValueError):
+            archive.archive_query()
+
+
+
+
+class StatsCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = 0
+        stats_cache._cache.clear()
+        self.addCleanup(stats_cache._cache.clear)
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return {'total': self.calls}
+
+    def test_concurrent_requests_share_one_computation(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: stats_cache._cached('k', 1, self.compute), range(8)))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'total': 1}] * 8)
+
+    def test_recomputes_only_when_sequence_advances(self):
+        stats_cache._cached('k', 1, self.compute)
+        self.assertEqual(stats_cache._cached('k', 1, self.compute), {'total': 1})
+        self.assertEqual(stats_cache._cached('k', 2, self.compute), {'total': 2})
+        self.assertEqual(stats_cache._cached('k', 1, self.compute), {'total': 2})  # stale reader
+        self.assertEqual(self.calls, 2)
+
+    def test_failure_is_not_cached(self):
+        def fail():
+            raise RuntimeError('mongo down')
+
+        with self.assertRaises(RuntimeError):
+            stats_cache._cached('k', 1, fail)
+        self.assertEqual(stats_cache._cached('k', 1, self.compute), {'total': 1})
+
+
+class EncodingProfileTests(SimpleTestCase):
+
+    def setUp(self):
+        from .rendering import render_ticket
+        self.img = render_ticket('MZXW6YTBOI2DGNBVGY3TQOJQ')
+
+    def test_every_profile_decodes_to_the_ticket_size(self):
+        from PIL import Image
+        from .rendering import ENCODING_PROFILES, encode_ticket_image
+
+        for name, options in ENCODING_PROFILES.items():
+            with self.subTest(profile=name):
+                decoded = Image.open(BytesIO(encode_ticket_image(self.img, name)))
+                self.assertEqual(decoded.format, options['format'])
+                self.assertEqual(decoded.size, self.img.size)
+
+    def test_palette_profile_is_quantized_and_smaller(self):
+        from PIL import Image
+        from .rendering import encode_ticket_image
+
+        data = encode_ticket_image(self.img, 'png-palette')
+        decoded = Image.open(BytesIO(data))
+        self.assertEqual(decoded.mode, 'P')
+        self.assertLessEqual(len(decoded.getcolors()), 128)
+        self.assertLess(len(data), len(encode_ticket_image(self.img, 'png')))
+
+    def test_unknown_profile_is_rejected(self):
+        from .rendering import encode_ticket_image
+
+        with self.assertRaises(ValueError):
+            encode_ticket_image(self.img, 'jpeg')
+
+    def test_zip_entries_use_the_profile_and_are_stored(self):
+        import zipfile
+        from .rendering import write_tickets_zip
+
+        zf = zipfile.ZipFile(write_tickets_zip(BytesIO(), ['MZXW6YTBOI2DGNBVGY3TQOJQ'], profile='webp'))
+
+        [entry] = zf.infolist()
+        self.assertEqual(entry.filename, 'ticket_MZXW6YTB.webp')
+        self.assertEqual(entry.compress_type, zipfile.ZIP_STORED)
+
+
+@override_settings(WARM_POOL_ENABLED=False, TICKET_PREVIEW_ENCODING='png-fast')
+class GenerateEncodingTests(MongoTestCase):
+
+    def generate(self, **body):
+        return self.client.post('/api/generate/', json.dumps({'count': 1, **body}),
+                                content_type='application/json')
+
+    def test_endpoint_default_is_used(self):
+        self.assertEqual(self.generate().json()['encoding'], 'png-fast')
+
+    def test_request_overrides_the_default(self):
+        response = self.generate(encoding='webp').json()
+
+        self.assertEqual((response['encoding'], response['content_type']), ('webp', 'image/webp'))
+        self.assertTrue(base64.b64decode(response['tickets'][0]['qr_image']).startswith(b'RIFF'))
+
+    def test_unknown_encoding_is_rejected_before_any_ticket_is_stored(self):
+        response = self.generate(encoding='jpeg')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.tickets().count_documents({}), 0)
+
+
+class TicketIdFormatTests(SimpleTestCase):
+
+    def test_compact_ids_are_uppercase_base32(self):
+        from .ticket_ids import new_ticket_id
+
+        ids = {new_ticket_id('compact') for _ in range(100)}
+
+        self.assertEqual(len(ids), 100)
+        for ticket_id in ids:
+            self.assertRegex(ticket_id, r'^[A-Z2-7]{24}$')
+
+    @override_settings(TICKET_ID_FORMAT='uuid')
+    def test_uuid_stays_the_default(self):
+        from .ticket_ids import new_ticket_id
+
+        self.assertRegex(new_ticket_id(), r'^[0-9a-f-]{36}$')
+
+    def test_unknown_format_is_rejected(self):
+        from .ticket_ids import new_ticket_id
+
+        with self.assertRaises(ValueError):
+            new_ticket_id('ulid')
+
+    def test_compact_ids_need_a_smaller_qr_version(self):
+        from qrcode.util import MODE_ALPHA_NUM
+        from .qr import _segment, error_correction_level, qr_version
+        from .ticket_ids import new_ticket_id
+
+        compact, uuid = new_ticket_id('compact'), new_ticket_id('uuid')
+        high = error_correction_level('H')
+
+        self.assertEqual(_segment(compact).mode, MODE_ALPHA_NUM)
+        self.assertLess(qr_version(compact, high), qr_version(uuid, high))
+
+    def test_error_correction_level_is_configurable(self):
+        from .qr import error_correction_level, qr_version
+
+        with override_settings(TICKET_QR_ERROR_CORRECTION='l'):
+            low = error_correction_level()
+        self.assertEqual(low, error_correction_level('L'))
+        self.assertLess(qr_version('MZXW6YTBOI2DGNBVGY3TQOJQ', low),
+                        qr_version('MZXW6YTBOI2DGNBVGY3TQOJQ', error_correction_level('H')))
+        with self.assertRaises(ValueError):
+            error_correction_level('X')
+
+
+@override_settings(WARM_POOL_ENABLED=False, TICKET_ID_FORMAT='compact')
+class CompactTicketIdTests(MongoTestCase):
+
+    def test_new_tickets_use_the_configured_format(self):
+        response = self.client.post('/api/generate/', json.dumps({'count': 2}), content_type='application/json')
+
+        for ticket in response.json()['tickets']:
+            self.assertRegex(ticket['id'], r'^[A-Z2-7]{24}$')
+        self.assertEqual(self.tickets().count_documents({}), 2)
+
+    def test_existing_uuid_tickets_keep_validating(self):
+        self.tickets().insert_one({'ticket_id': '3f2b8c1e-9d4a-4e6f-b1c2-7a8d9e0f1a2b', 'is_used': False})
+
+        response = self.client.post('/api/validate/', {'code': '3f2b8c1e-9d4a-4e6f-b1c2-7a8d9e0f1a2b'})
+        self.assertEqual(response.json()['status'], 'success')
@@ -0,0 +1,37 @@
+"""
+Ticket ID formats.
+
+    uuid     36-character uuid4 string (the original format)
+    compact  120 random bits as 24 uppercase base32 characters
+
+Compact IDs only use characters from the QR alphanumeric set, so they encode
+at 5.5 bits per character instead of 8 and need a much smaller QR version,
+which renders faster and is easier for gate webcams to lock on to.
+Both formats are plain strings in the tickets collection, so existing UUID
+tickets keep validating whatever format new tickets use.
+"""
+
+import base64
+import secrets
+import uuid
+
+from django.conf import settings
+
+COMPACT_ID_BYTES = 15  # 120 bits -> exactly 24 base32 characters, no padding
+
+ID_FORMATS = ('uuid', 'compact')
+
+
+def new_compact_id():
+    """Random 24-character uppercase base32 ID."""
+    return base64.b32encode(secrets.token_bytes(COMPACT_ID_BYTES)).decode('ascii')
+
+
+def new_ticket_id(id_format=None):
+    """Return a new ticket ID in `id_format` (default: settings.TICKET_ID_FORMAT)."""
+    id_format = id_format or settings.TICKET_ID_FORMAT
+    if id_format == 'compact':
+        return new_compact_id()
+    if id_format == 'uuid':
+        return str(uuid.uuid4())
+    raise ValueError(f'Unknown ticket ID format: {id_format}')
@@ -3,14 +3,22 @@ from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from .models import Ticket
-from .mongodb_utils import create_user, authenticate_user, get_user_by_username, get_ticket_stats
-import qrcode
-import base64
+from .mongodb_utils import create_user, authenticate_user, get_user_by_username, ticket_change_seq
+from .stats_cache import cached_group_stats, cached_ticket_stats, stats_etag
+from .ticket_ids import new_ticket_id
+from .idempotency import idempotent
+# Rendering (Pillow, qrcode, zipfile – see rendering.py) is imported inside the
+# views that draw tickets, so login/validate/dashboard requests on a freshly
+# woken instance don't pay for loading it.
 from io import BytesIO
-import zipfile
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from functools import wraps
+import re
+import time
+
+# Event IDs: short slugs like "techfest-2026"
+EVENT_ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
 
 
 def login_required_custom(view_func):
@@ -26,159 +34,40 @@ def login_required_custom(view_func):
     return wrapper
 
 
-def hex_to_rgb(hex_color):
-    """Convert hex color to RGB tuple"""
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+def requested_encoding(requested, default):
+    """
+    Return the encoding profile to use: the one asked for by the request,
+    else the endpoint default from settings. Raises ValueError if unknown.
+    """
+    from .rendering import ENCODING_PROFILES
+
+    encoding = requested or default
+    if encoding not in ENCODING_PROFILES:
+        raise ValueError(f'Unknown encoding: {encoding}')
+    return encoding
+
 
-def generate_ticket_image(ticket_id, design_config=None):
+def requested_creator(request, body=None):
     """
-    Generate a classy LANDSCAPE ticket image with custom design using Pillow.
-    Returns base64 encoded image and PIL Image object.
+    Username to record as the creator of new tickets: the session user, else
+    the "created_by" the (cross-origin) Next.js client sends, else None.
     """
-    # Default design if none provided
-    if not design_config:
-        design_config = {
-            'event_name': 'EVENT PASS',
-            'ticket_type': 'entry',
-            'price': 0,
-            'primary_color': '#2563eb',
-            'secondary_color': '#1e40af',
-            'background_style': 'gradient'
-        }
-    
-    # Ticket dimensions - LANDSCAPE (wider than tall)
-    width, height = 800, 350
-    
-    # Create base image with colored background
-    img = Image.new('RGB', (width, height), 'white')
-    draw = ImageDraw.Draw(img)
-    
-    # Parse colors
-    primary_rgb = hex_to_rgb(design_config['primary_color'])
-    secondary_rgb = hex_to_rgb(design_config['secondary_color'])
-    
-    # Create full background gradient
-    if design_config['background_style'] == 'gradient':
-        for x in range(width):
-            ratio = x / width
-            r = int(primary_rgb[0] * (1 - ratio) + secondary_rgb[0] * ratio)
-            g = int(primary_rgb[1] * (1 - ratio) + secondary_rgb[1] * ratio)
-            b = int(primary_rgb[2] * (1 - ratio) + secondary_rgb[2] * ratio)
-            draw.rectangle([(x, 0), (x + 1, height)], fill=(r, g, b))
-    else:
-        draw.rectangle([(0, 0), (width, height)], fill=primary_rgb)
-    
-    # Add subtle decorative circles pattern (very light)
-    for i in range(0, width, 100):
-        for j in range(0, height, 100):
-            # Draw semi-transparent circles
-            overlay = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-            overlay_draw = ImageDraw.Draw(overlay)
-            overlay_draw.ellipse([(i-25, j-25), (i+25, j+25)], fill=(255, 255, 255, 15))
-            img.paste(overlay, (0, 0), overlay)
-    
-    # Add very subtle diagonal accent lines (minimal)
-    overlay = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-    overlay_draw = ImageDraw.Draw(overlay)
-    for i in range(-height, width, 120):
-        overlay_draw.line([(i, 0), (i + height, height)], fill=(255, 255, 255, 8), width=2)
-    img.paste(overlay, (0, 0), overlay)
-    
-    # Try to load fonts
-    try:
-        title_font = ImageFont.truetype("arial.ttf", 48)
-        subtitle_font = ImageFont.truetype("arial.ttf", 28)
-        info_font = ImageFont.truetype("arial.ttf", 20)
-        small_font = ImageFont.truetype("arial.ttf", 14)
-    except:
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-        info_font = ImageFont.load_default()
-        small_font = ImageFont.load_default()
-    
-    # LEFT SECTION - Event Information
-    left_margin = 40
-    
-    # Event name (top left)
-    event_name = design_config['event_name']
-    draw.text((left_margin, 50), event_name.upper(), 
-              fill='white', font=title_font)
-    
-    # Ticket type and price (below event name)
-    if design_config['ticket_type'] == 'paid':
-        price_text = f"PAID ENTRY | ₹{design_config['price']}"
-    else:
-        price_text = "FREE ENTRY"
-    
-    draw.text((left_margin, 120), price_text, 
-              fill='white', font=subtitle_font)
-    
-    # Ticket ID (bottom left)
-    id_text = f"TICKET ID: {str(ticket_id)[:8].upper()}"
-    draw.text((left_margin, height - 80), id_text, 
-              fill='white', font=info_font)
-    
-    # Admit One text
-    draw.text((left_margin, height - 50), "ADMIT ONE", 
-              fill='white', font=small_font)
-    
-    # RIGHT SECTION - QR Code (large, centered right half for easy scanning)
-    qr = qrcode.QRCode(box_size=10, border=3, error_correction=qrcode.constants.ERROR_CORRECT_H)
-    qr.add_data(str(ticket_id))
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Resize QR code – make it tall enough to fill most of the right panel
-    qr_size = 220
-    qr_img = qr_img.resize((qr_size, qr_size), resample=0)
+    creator = request.session.get('username') or (body or {}).get('created_by')
+    return str(creator)[:150] if creator else None
+
+
+def requested_event_id(value):
+    """
+    Return the event ID named by the request, or None if it didn't name one.
+    Raises ValueError for malformed IDs.
+    """
+    if not value:
+        return None
+    value = str(value).strip()
+    if not EVENT_ID_RE.match(value):
+        raise ValueError('Invalid event ID')
+    return value
 
-    # Center QR vertically within the right section, with margin from edge
-    qr_x = width - qr_size - 20
-    qr_y = (height - qr_size) // 2
-    
-    # Add white rounded background for QR code
-    qr_bg_padding = 15
-    qr_bg_rect = [
-        qr_x - qr_bg_padding,
-        qr_y - qr_bg_padding,
-        qr_x + qr_size + qr_bg_padding,
-        qr_y + qr_size + qr_bg_padding
-    ]
-    draw.rounded_rectangle(qr_bg_rect, radius=15, fill='white')
-    
-    # Paste QR code
-    img.paste(qr_img, (qr_x, qr_y))
-    
-    # Add "SCAN HERE" text above QR
-    scan_text = "SCAN HERE"
-    bbox = draw.textbbox((0, 0), scan_text, font=small_font)
-    text_width = bbox[2] - bbox[0]
-    draw.text((qr_x + (qr_size - text_width) // 2, qr_y - 25), 
-              scan_text, fill='white', font=small_font)
-    
-    # Add decorative corner elements
-    corner_size = 30
-    corner_color = (255, 255, 255, 100)
-    
-    # Top left corner
-    draw.rectangle([(0, 0), (corner_size, 5)], fill=corner_color)
-    draw.rectangle([(0, 0), (5, corner_size)], fill=corner_color)
-    
-    # Top right corner
-    draw.rectangle([(width - corner_size, 0), (width, 5)], fill=corner_color)
-    draw.rectangle([(width - 5, 0), (width, corner_size)], fill=corner_color)
-    
-    # Bottom left corner
-    draw.rectangle([(0, height - 5), (corner_size, height)], fill=corner_color)
-    draw.rectangle([(0, height - corner_size), (5, height)], fill=corner_color)
-    
-    # Convert to base64 for HTML display
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    
-    return img_str, img
 
 # --- DESIGN CONFIGURATOR ---
 def design_configurator(request):
@@ -207,6 +96,8 @@ def generate_tickets(request):
     Generates N tickets with custom design and displays them for printing/distribution.
     Run this BEFORE the event.
     """
+    from .rendering import generate_ticket_image
+
     tickets_to_show = []
     design_config = request.session.get('ticket_design', None)
     
@@ -239,26 +130,21 @@ def download_tickets_zip(request):
     """
     Downloads the last generated tickets as a ZIP file with custom design.
     """
+    from .rendering import write_tickets_zip
+
     ticket_ids = request.session.get('last_generated_tickets', [])
     design_config = request.session.get('ticket_design', None)
     
     if not ticket_ids:
         return HttpResponse("No tickets to download. Please generate tickets first.", status=400)
     
+    try:
+        encoding = requested_encoding(request.GET.get('encoding'), settings.TICKET_DOWNLOAD_ENCODING)
+    except ValueError as exc:
+        return HttpResponse(str(exc), status=400)
+    
     # Create ZIP file in memory
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for ticket_id in ticket_ids:
-            # Generate custom ticket image
-            _, img = generate_ticket_image(ticket_id, design_config)
-            
-            # Save to buffer
-            img_buffer = BytesIO()
-            img.save(img_buffer, format="PNG")
-            img_buffer.seek(0)
-            
-            # Add to ZIP with filename
-            zip_file.writestr(f'ticket_{ticket_id[:8]}.png', img_buffer.getvalue())
+    zip_buffer = write_tickets_zip(BytesIO(), ticket_ids, design_config, profile=encoding)
     
     # Prepare response
     zip_buffer.seek(0)
@@ -267,6 +153,43 @@ def download_tickets_zip(request):
     
     return response
 
+def _tickets_pdf_response(ticket_ids, design_config, paper, ticket_width_mm):
+    """Stream ticket_ids as an N-up print sheet PDF (see print_sheets.py)."""
+    from django.http import StreamingHttpResponse
+    from .print_sheets import SheetLayout, iter_tickets_pdf
+
+    try:
+        SheetLayout(paper, ticket_width_mm)
+    except ValueError as exc:
+        return HttpResponse(str(exc), status=400)
+
+    response = StreamingHttpResponse(
+        iter_tickets_pdf(ticket_ids, design_config, paper, ticket_width_mm),
+        content_type='application/pdf',
+    )
+    response['Content-Disposition'] = 'attachment; filename="event_tickets.pdf"'
+    return response
+
+def download_tickets_pdf(request):
+    """
+    Downloads the last generated tickets as a print-ready PDF
+    (many tickets per A4/Letter page, with cut marks).
+    """
+    from .print_sheets import DEFAULT_TICKET_WIDTH_MM
+
+    ticket_ids = request.session.get('last_generated_tickets', [])
+    design_config = request.session.get('ticket_design', None)
+    
+    if not ticket_ids:
+        return HttpResponse("No tickets to download. Please generate tickets first.", status=400)
+    
+    try:
+        ticket_width_mm = float(request.GET.get('ticket_width_mm', DEFAULT_TICKET_WIDTH_MM))
+    except ValueError:
+        return HttpResponse("Invalid ticket width.", status=400)
+    
+    return _tickets_pdf_response(ticket_ids, design_config, request.GET.get('paper', 'a4'), ticket_width_mm)
+
 def landing_page(request):
     """
     Landing page redirects to dashboard if logged in, otherwise to login.
@@ -291,46 +214,101 @@ def validate_ticket_api(request):
     if request.method != "POST":
         return JsonResponse({'status': 'error', 'message': 'Bad Request'})
 
+    started = time.perf_counter()
+
     # Support both JSON body (Next.js) and form-encoded (original Django template)
     scanned_code = None
+    gate_id = request.headers.get('X-Gate-Id')
+    event_id = request.headers.get('X-Event-Id')
     content_type = request.content_type or ''
     if 'application/json' in content_type:
         import json as _json
         try:
             body = _json.loads(request.body)
             scanned_code = body.get('code')
+            gate_id = body.get('gate') or gate_id
+            event_id = body.get('event') or event_id
         except Exception:
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
     else:
         scanned_code = request.POST.get('code')
+        gate_id = request.POST.get('gate') or gate_id
+        event_id = request.POST.get('event') or event_id
 
     if not scanned_code:
         return JsonResponse({'status': 'error', 'message': 'No ticket code provided'})
+    if not isinstance(scanned_code, str):
+        # A JSON object here would be a query operator ({"$ne": null}) in the lookup below
+        return JsonResponse({'status': 'error', 'message': 'Invalid ticket code'}, status=400)
+
+    try:
+        event_id = requested_event_id(event_id)
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
 
-    from .mongodb_utils import get_tickets_collection
+    # Gate IDs key the scan rollups: always a short string, whatever was sent
+    gate_id = str(gate_id or 'default')[:64]
+
+    from datetime import datetime
+    from pymongo import ReturnDocument
+    from .mongodb_utils import get_tickets_collection, event_filter, bump_ticket_change_seq
+    from .scan_log import record_scan
     tickets = get_tickets_collection()
 
-    ticket = tickets.find_one({'ticket_id': scanned_code})
+    # Scanners that send an event only admit that event's tickets;
+    # without one, any ticket is accepted (original behaviour)
+    scope = event_filter(event_id) if event_id else {}
+
+    # Fast path: mark a fresh ticket as used in one atomic round trip
+    # (also stops two gates admitting the same ticket at once)
+    ticket = tickets.find_one_and_update(
+        {**scope, 'ticket_id': scanned_code, 'is_used': False},
+        {'$set': {'is_used': True, 'scanned_at': datetime.utcnow()}},
+        projection={'event_id': 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if ticket:
+        bump_ticket_change_seq([ticket.get('event_id') or settings.DEFAULT_EVENT_ID])
+        record_scan(scanned_code, gate_id, 'granted', (time.perf_counter() - started) * 1000)
+        return JsonResponse({'status': 'success', 'message': 'ENTRY GRANTED ✅'})
+
+    # Rejected – find out why
+    ticket = tickets.find_one({**scope, 'ticket_id': scanned_code})
 
     if not ticket:
+        if event_id and tickets.find_one({'ticket_id': scanned_code}, {'_id': 1}):
+            record_scan(scanned_code, gate_id, 'wrong_event', (time.perf_counter() - started) * 1000)
+            return JsonResponse({'status': 'error', 'message': 'WRONG EVENT'})
+        record_scan(scanned_code, gate_id, 'invalid', (time.perf_counter() - started) * 1000)
         return JsonResponse({'status': 'error', 'message': 'INVALID TICKET'})
 
-    if ticket.get('is_used'):
-        scan_time = str(ticket.get('scanned_at', ''))
-        return JsonResponse({
-            'status': 'error',
-            'message': 'ALREADY USED!',
-            'time': scan_time,
-        })
+    record_scan(scanned_code, gate_id, 'already_used', (time.perf_counter() - started) * 1000)
+    scan_time = str(ticket.get('scanned_at', ''))
+    return JsonResponse({
+        'status': 'error',
+        'message': 'ALREADY USED!',
+        'time': scan_time,
+    })
 
-    # Mark as used
-    from datetime import datetime
-    now = datetime.utcnow()
-    tickets.update_one(
-        {'ticket_id': scanned_code},
-        {'$set': {'is_used': True, 'scanned_at': now}}
-    )
-    return JsonResponse({'status': 'success', 'message': 'ENTRY GRANTED ✅'})
+
+@csrf_exempt
+def api_gate_throughput(request):
+    """
+    JSON API: per-gate, per-minute scan counts by verdict (scan_log.VERDICTS)
+    for the last ?minutes= minutes (default 30), optionally for one ?gate=.
+    Answered from the pre-aggregated rollups, not the raw event log.
+    """
+    from .scan_log import gate_throughput
+
+    try:
+        minutes = min(int(request.GET.get('minutes', 30)), 24 * 60)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid minutes'}, status=400)
+
+    return JsonResponse({
+        'minutes': minutes,
+        'gates': gate_throughput(minutes, request.GET.get('gate')),
+    })
 
 
 # --- AUTHENTICATION SECTION ---
@@ -419,17 +397,37 @@ def dashboard_view(request):
     """
     username = request.session.get('username', 'User')
     
+    try:
+        event_id = requested_event_id(request.GET.get('event'))
+    except ValueError as exc:
+        return HttpResponse(str(exc), status=400)
+    
+    # Unchanged stats for the same user: let the browser reuse its copy
+    # (unless there are flash messages waiting to be shown)
+    import hashlib
+    seq = ticket_change_seq(event_id)
+    etag = stats_etag(event_id, seq, hashlib.sha1(username.encode()).hexdigest()[:8])
+    if etag in request.headers.get('If-None-Match', '') and not len(messages.get_messages(request)):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+    
     # Get user stats using direct MongoDB queries (avoiding djongo compatibility issues)
-    stats = get_ticket_stats()
+    stats = cached_ticket_stats(event_id, seq)
     
     context = {
         'username': username,
+        'event_id': event_id,
         'total_tickets': stats['total'],
         'used_tickets': stats['used'],
         'available_tickets': stats['available'],
+        'archived_tickets': stats['archived'],
     }
     
-    return render(request, 'dashboard.html', context)
+    response = render(request, 'dashboard.html', context)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # ============================================================
@@ -503,15 +501,60 @@ def api_logout(request):
 
 @csrf_exempt
 def api_dashboard(request):
-    """JSON API: return ticket stats for the dashboard."""
+    """
+    JSON API: return ticket stats for the dashboard (one ?event=, or all events).
+    Send the ETag back in If-None-Match to get 304 while nothing has changed.
+    """
     # Session cookie auth doesn't work cross-origin in dev;
     # access is guarded on the Next.js side via localStorage.
-    stats = get_ticket_stats()
-    return JsonResponse({
-        'total_tickets': stats['total'],
-        'used_tickets':  stats['used'],
-        'available_tickets': stats['available'],
-    })
+    try:
+        event_id = requested_event_id(request.GET.get('event'))
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+
+    # One find_one decides whether anything changed since the client's copy
+    seq = ticket_change_seq(event_id)
+    etag = stats_etag(event_id, seq)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    else:
+        stats = cached_ticket_stats(event_id, seq)
+        response = JsonResponse({
+            'event_id': event_id,
+            'total_tickets': stats['total'],
+            'used_tickets':  stats['used'],
+            'available_tickets': stats['available'],
+            'archived_tickets': stats['archived'],
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@csrf_exempt
+def api_group_stats(request):
+    """
+    JSON API: totals, used and available per creator and per batch
+    (one ?event=, or all events; ?created_by= for one organiser's numbers).
+    Cached and ETagged like api_dashboard.
+    """
+    try:
+        event_id = requested_event_id(request.GET.get('event'))
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+    created_by = request.GET.get('created_by') or None
+
+    import hashlib
+    seq = ticket_change_seq(event_id)
+    etag = stats_etag(event_id, seq, 'groups', hashlib.sha1((created_by or '').encode()).hexdigest()[:8])
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    else:
+        stats = cached_group_stats(event_id, created_by, seq)
+        response = JsonResponse({'event_id': event_id, 'created_by': created_by, **stats})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @csrf_exempt
@@ -531,8 +574,64 @@ def api_save_design(request):
 
 
 @csrf_exempt
+def api_design_preview(request):
+    """
+    JSON API: thumbnail of a design with a placeholder QR code (no tickets are
+    created). GET takes the design fields as query parameters, POST a JSON
+    design. Optional ?scale= (2-4, default 2) and ?encoding=.
+    Responses carry an ETag, so unchanged previews come back as 304.
+    """
+    from .previews import preview_etag, render_preview
+    from .rendering import ENCODING_PROFILES
+
+    if request.method == 'POST':
+        import json
+        try:
+            design_config = json.loads(request.body)
+        except Exception:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    else:
+        design_config = {key: value for key, value in request.GET.items() if key not in ('scale', 'encoding')}
+    if not isinstance(design_config, dict):
+        return JsonResponse({'status': 'error', 'message': 'Design must be a JSON object'}, status=400)
+
+    try:
+        scale = int(request.GET.get('scale', 2))
+        if not 2 <= scale <= 4:
+            raise ValueError('scale must be between 2 and 4')
+        encoding = requested_encoding(request.GET.get('encoding'), 'png')
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+
+    try:
+        etag = preview_etag(design_config, scale, encoding)
+        data = None
+        if etag not in request.headers.get('If-None-Match', ''):
+            data = render_preview(design_config, scale, encoding)
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid design'}, status=400)
+
+    if data is None:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(data, content_type=ENCODING_PROFILES[encoding]['content_type'])
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+@csrf_exempt
+@idempotent
 def api_generate(request):
-    """JSON API: generate N tickets and return base64 images (stores in MongoDB)."""
+    """
+    JSON API: generate N tickets for an event (default: DEFAULT_EVENT_ID) and
+    return base64 images. Tickets are stored in MongoDB as one batch.
+    With {"stream": true} (or Accept: application/x-ndjson) the tickets are
+    streamed as NDJSON lines while they are generated.
+    Retries with the same Idempotency-Key header replay the first result, or
+    finish its batch if the first attempt was cut off.
+    """
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
 
@@ -540,42 +639,140 @@ def api_generate(request):
     # access is guarded on the Next.js side via localStorage.
     import json
     from datetime import datetime
-    from .mongodb_utils import get_tickets_collection
+    from .mongodb_utils import get_tickets_collection, bump_ticket_change_seq
+    from .rendering import generate_ticket_image, render_ticket_background, ENCODING_PROFILES
 
     try:
         body = json.loads(request.body)
     except Exception:
         return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
 
+    # Synchronous path only – bigger batches go through api_generate_job
     count         = min(int(body.get('count', 5)), 100)
     design_config = body.get('design') or {}
 
-    tickets_collection = get_tickets_collection()
-    tickets_out = []
-    ticket_ids  = []
+    try:
+        encoding = requested_encoding(body.get('encoding'), settings.TICKET_PREVIEW_ENCODING)
+        event_id = requested_event_id(body.get('event_id')) or settings.DEFAULT_EVENT_ID
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
 
-    for _ in range(count):
-        import uuid
-        ticket_id = str(uuid.uuid4())
+    # The background is cached and needed for every ticket anyway; rendering
+    # it first turns a broken design into a 400 before any ticket is stored
+    try:
+        render_ticket_background(design_config)
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid design'}, status=400)
+
+    import uuid
+    from .idempotency import record_batch, record_tickets, resumed_batch
+
+    # A retry of an interrupted request (same Idempotency-Key) continues its batch
+    batch_id, resumed_ids = resumed_batch(request)
+    if not batch_id:
+        batch_id = uuid.uuid4().hex
+        record_batch(request, batch_id)
+    created_by = requested_creator(request, body)
+
+    def generate():
+        """Persist and render one ticket at a time, yielding (id, base64 image)."""
+        from .rendering import design_hash
+        from .warm_pool import claim_tickets, record_design_use
+
+        tickets_collection = get_tickets_collection()
+
+        # Tickets the interrupted attempt already inserted: only their images
+        # were lost, so render them again
+        for ticket_id in resumed_ids:
+            img_str, _ = generate_ticket_image(ticket_id, design_config, encoding)
+            yield {'id': ticket_id, 'qr_image': img_str}
+        remaining = count - len(resumed_ids)
+
+        # Pre-rendered tickets from the warm pool first (if enabled); they only
+        # become valid tickets once inserted here with this event and batch.
+        # The dashboards' change sequence is bumped once for the whole batch,
+        # even if the client goes away part way through.
+        inserted = rendered = 0
+        pooled = []
+        try:
+            pooled = claim_tickets(design_hash(design_config), encoding, remaining)
+            if pooled:
+                now = datetime.utcnow()
+                tickets_collection.insert_many([{
+                    'ticket_id': ticket['id'],
+                    'is_used':   False,
+                    'scanned_at': None,
+                    'created_at': now,
+                    'event_id':  event_id,
+                    'batch_id':  batch_id,
+                    'created_by': created_by,
+                } for ticket in pooled])
+                inserted += len(pooled)
+                record_tickets(request, [ticket['id'] for ticket in pooled])
+                yield from pooled
+
+            # Render the shortfall
+            for _ in range(remaining - len(pooled)):
+                ticket_id = new_ticket_id()
+
+                # Save directly to MongoDB (same collection that get_ticket_stats reads from)
+                tickets_collection.insert_one({
+                    'ticket_id': ticket_id,
+                    'is_used':   False,
+                    'scanned_at': None,
+                    'created_at': datetime.utcnow(),
+                    'event_id':  event_id,
+                    'batch_id':  batch_id,
+                    'created_by': created_by,
+                })
+                inserted += 1
+                record_tickets(request, [ticket_id])
+
+                img_str, _ = generate_ticket_image(ticket_id, design_config, encoding)
+                rendered += 1
+                yield {'id': ticket_id, 'qr_image': img_str}
+        finally:
+            if inserted:
+                bump_ticket_change_seq([event_id])
+            # Only designs known to render are kept warm
+            if pooled or rendered:
+                record_design_use(design_hash(design_config), design_config, encoding,
+                                  len(pooled), remaining - len(pooled))
+
+    meta = {
+        'event_id': event_id,
+        'batch_id': batch_id,
+        'encoding': encoding,
+        'content_type': ENCODING_PROFILES[encoding]['content_type'],
+    }
 
-        # Save directly to MongoDB (same collection that get_ticket_stats reads from)
-        tickets_collection.insert_one({
-            'ticket_id': ticket_id,
-            'is_used':   False,
-            'scanned_at': None,
-            'created_at': datetime.utcnow(),
-        })
+    if body.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        # One JSON object per line: the batch metadata, then each ticket as
+        # soon as it is stored and rendered, then a summary line
+        from django.http import StreamingHttpResponse
 
-        ticket_ids.append(ticket_id)
-        img_str, _ = generate_ticket_image(ticket_id, design_config)
-        tickets_out.append({'id': ticket_id, 'qr_image': img_str})
+        def ndjson_lines():
+            yield json.dumps({'type': 'batch', 'count': count, **meta}) + '\n'
+            sent = 0
+            for ticket in generate():
+                sent += 1
+                yield json.dumps({'type': 'ticket', **ticket}) + '\n'
+            yield json.dumps({'type': 'done', 'count': sent}) + '\n'
 
-    return JsonResponse({'tickets': tickets_out})
+        response = StreamingHttpResponse(ndjson_lines(), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'  # don't let a proxy hold lines back
+        return response
+
+    return JsonResponse({'tickets': list(generate()), **meta})
 
 
 @csrf_exempt
+@idempotent
 def api_download_tickets(request):
-    """JSON API: download tickets as a ZIP."""
+    """
+    JSON API: download tickets as a ZIP of images (see ENCODING_PROFILES),
+    or as a print-sheet PDF with {"format": "pdf", "paper": "a4" | "letter"}.
+    """
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
 
@@ -591,15 +788,134 @@ def api_download_tickets(request):
     if not ticket_ids:
         return HttpResponse('No tickets to download.', status=400)
 
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for tid in ticket_ids:
-            _, img = generate_ticket_image(tid, design_config)
-            img_buf = BytesIO()
-            img.save(img_buf, format='PNG')
-            zf.writestr(f'ticket_{tid[:8]}.png', img_buf.getvalue())
+    if body.get('format') == 'pdf':
+        from .print_sheets import DEFAULT_TICKET_WIDTH_MM
+        try:
+            ticket_width_mm = float(body.get('ticket_width_mm', DEFAULT_TICKET_WIDTH_MM))
+        except (TypeError, ValueError):
+            return HttpResponse('Invalid ticket width.', status=400)
+        return _tickets_pdf_response(ticket_ids, design_config, body.get('paper', 'a4'), ticket_width_mm)
+
+    try:
+        encoding = requested_encoding(body.get('encoding'), settings.TICKET_DOWNLOAD_ENCODING)
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+
+    from .rendering import write_tickets_zip
+    zip_buffer = write_tickets_zip(BytesIO(), ticket_ids, design_config, profile=encoding)
 
     zip_buffer.seek(0)
     response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
     response['Content-Disposition'] = 'attachment; filename="event_tickets.zip"'
     return response
+
+
+@csrf_exempt
+def api_admission_stats(request):
+    """JSON API: admission control counters (active, queued, admitted, shed) per class."""
+    from .admission import admission_stats
+    return JsonResponse(admission_stats())
+
+
+def api_warm_pool_stats(request):
+    """JSON API: warm pool size and hit rate per recently used design."""
+    from .warm_pool import pool_stats
+    return JsonResponse(pool_stats())
+
+
+# ── Background generation jobs (large batches) ───────────────────────────
+
+@csrf_exempt
+def api_generate_job(request):
+    """
+    JSON API: queue a large ticket generation job.
+    Unlike api_generate there is no 100-ticket cap (only TICKET_JOB_MAX_COUNT);
+    poll api_job_status with the returned job_id, then fetch the ZIP.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    import json
+    from .jobs import submit_generation_job
+
+    try:
+        body = json.loads(request.body)
+        count = int(body.get('count', 5))
+    except Exception:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+
+    if count < 1 or count > settings.TICKET_JOB_MAX_COUNT:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'count must be between 1 and {settings.TICKET_JOB_MAX_COUNT}',
+        }, status=400)
+
+    try:
+        encoding = requested_encoding(body.get('encoding'), settings.TICKET_DOWNLOAD_ENCODING)
+        event_id = requested_event_id(body.get('event_id')) or settings.DEFAULT_EVENT_ID
+    except ValueError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+
+    # Render the design once now: a broken one must fail here, not after the
+    # worker has created every ticket
+    from .rendering import render_ticket_background
+    design_config = body.get('design') or {}
+    try:
+        render_ticket_background(design_config)
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid design'}, status=400)
+
+    job_id = submit_generation_job(count, design_config, encoding, event_id,
+                                   created_by=requested_creator(request, body))
+    return JsonResponse({
+        'status': 'accepted',
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}/',
+    }, status=202)
+
+
+@csrf_exempt
+def api_job_status(request, job_id):
+    """JSON API: progress of a generation job; lists the batch once it's done."""
+    from .jobs import get_job
+
+    job = get_job(job_id)
+    if not job:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+    data = {
+        'job_id':   job_id,
+        'status':   job['status'],
+        'count':    job['count'],
+        'rendered': job['rendered'],
+        'progress': round(job['rendered'] / job['count'], 3) if job['count'] else 1.0,
+        'error':    job['error'],
+    }
+    if job['status'] == 'done':
+        data['batch_id'] = job_id
+        data['event_id'] = job['event_id']
+        data['ticket_ids'] = job['ticket_ids']
+        data['download_url'] = f'/api/jobs/{job_id}/download/'
+    return JsonResponse(data)
+
+
+@csrf_exempt
+def api_job_download(request, job_id):
+    """JSON API: download the ZIP produced by a finished generation job."""
+    from django.http import FileResponse
+    from .jobs import get_job, open_job_result
+
+    job = get_job(job_id)
+    if not job:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    if job['status'] == 'expired':
+        return JsonResponse({'status': 'error', 'message': 'Job result has expired'}, status=410)
+    if job['status'] != 'done':
+        return JsonResponse({'status': 'error', 'message': f'Job is {job["status"]}'}, status=409)
+
+    return FileResponse(
+        open_job_result(job),
+        as_attachment=True,
+        filename='event_tickets.zip',
+        content_type='application/zip',
+    )
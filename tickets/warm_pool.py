@@ -0,0 +1,197 @@
+"""
+Warm pool of pre-rendered tickets for recently used designs.
+
+Rendering is nearly all of api_generate's latency, and organisers reuse a few
+saved designs. When WARM_POOL_ENABLED is set, each design (and encoding)
+api_generate uses is remembered in `pool_designs`, and idle time – the
+keep-alive cron ping – is used to render unassigned tickets for those designs
+into `ticket_pool`. api_generate then claims pooled tickets atomically and
+only renders the shortfall.
+
+A refill only starts when no render or validate request has run for
+WARM_POOL_IDLE_SECONDS, and it renders each ticket in a free render slot
+(admission.py), taken without queueing; it stops as soon as requests need
+the slots.
+
+Pooled tickets are not in the tickets collection, so they can't be scanned
+until claimed; claiming inserts them with the caller's event and batch.
+Designs not used for WARM_POOL_DESIGN_TTL_HOURS are evicted with their tickets.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .mongodb_utils import get_pool_collection, get_pool_designs_collection
+from .ticket_ids import new_ticket_id
+
+logger = logging.getLogger(__name__)
+
+_refill_lock = threading.Lock()
+_indexes_ready = False
+
+
+def _ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    from pymongo import ASCENDING
+    get_pool_collection().create_index([('design_hash', ASCENDING), ('encoding', ASCENDING)])
+    get_pool_designs_collection().create_index(
+        [('design_hash', ASCENDING), ('encoding', ASCENDING)], unique=True,
+    )
+    _indexes_ready = True
+
+
+def claim_tickets(design_hash, encoding, count):
+    """
+    Claim up to `count` pooled tickets for a design; returns a list of
+    {'id', 'qr_image'}. Each claim is an atomic find_one_and_delete, so two
+    requests never get the same ticket.
+    """
+    if not settings.WARM_POOL_ENABLED:
+        return []
+    _ensure_indexes()
+
+    pool = get_pool_collection()
+    claimed = []
+    while len(claimed) < count:
+        doc = pool.find_one_and_delete({'design_hash': design_hash, 'encoding': encoding})
+        if not doc:
+            break
+        claimed.append({'id': doc['ticket_id'], 'qr_image': doc['image']})
+    return claimed
+
+
+def record_design_use(design_hash, design_config, encoding, hits, misses):
+    """
+    Remember a design for refills and count its pool hits/misses. Call it
+    only once the design has rendered: refills render every recorded design.
+    """
+    if not settings.WARM_POOL_ENABLED:
+        return
+    _ensure_indexes()
+    get_pool_designs_collection().update_one(
+        {'design_hash': design_hash, 'encoding': encoding},
+        {
+            '$set': {'design': design_config or {}, 'last_used': datetime.utcnow()},
+            '$inc': {'hits': hits, 'misses': misses},
+        },
+        upsert=True,
+    )
+
+
+def _evict(design):
+    get_pool_collection().delete_many({'design_hash': design['design_hash'], 'encoding': design['encoding']})
+    get_pool_designs_collection().delete_one({'_id': design['_id']})
+
+
+def evict_stale_designs():
+    """Drop designs (and their pooled tickets) not used within the TTL."""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.WARM_POOL_DESIGN_TTL_HOURS)
+    stale = get_pool_designs_collection().find({'last_used': {'$lt': cutoff}}, {'design_hash': 1, 'encoding': 1})
+    for doc in stale:
+        _evict(doc)
+
+
+def fill_pool(budget_seconds=None):
+    """
+    Top up the pool for the most recently used designs, spending at most
+    `budget_seconds` rendering and stopping early when no render slot is free.
+    A design that fails to render is evicted; the others are still filled.
+    Returns the number of tickets rendered.
+    """
+    from .admission import CLASSES
+    from .rendering import generate_ticket_image
+
+    _ensure_indexes()
+    budget_seconds = budget_seconds or settings.WARM_POOL_FILL_SECONDS
+    deadline = time.monotonic() + budget_seconds
+    pool = get_pool_collection()
+    render_slots = CLASSES['render']
+    rendered = 0
+    busy = False
+
+    recent = get_pool_designs_collection().find().sort('last_used', -1).limit(settings.WARM_POOL_MAX_DESIGNS)
+    for design in recent:
+        key = {'design_hash': design['design_hash'], 'encoding': design['encoding']}
+        shortfall = settings.WARM_POOL_SIZE - pool.count_documents(key)
+
+        batch = []
+        while shortfall > 0 and time.monotonic() < deadline:
+            if not render_slots.try_acquire():
+                busy = True
+                break
+            try:
+                ticket_id = new_ticket_id()
+                img_str, _ = generate_ticket_image(ticket_id, design['design'], design['encoding'])
+            except Exception:
+                logger.exception('Evicting warm pool design %s: it fails to render', design['design_hash'])
+                _evict(design)
+                batch = []
+                break
+            finally:
+                render_slots.release()
+            batch.append({**key, 'ticket_id': ticket_id, 'image': img_str, 'created_at': datetime.utcnow()})
+            shortfall -= 1
+        if batch:
+            pool.insert_many(batch, ordered=False)
+            rendered += len(batch)
+        if busy or time.monotonic() >= deadline:
+            break
+    return rendered
+
+
+def refill():
+    """Evict stale designs and fill the pool (one refill at a time per process)."""
+    if not _refill_lock.acquire(blocking=False):
+        return
+    try:
+        evict_stale_designs()
+        fill_pool()
+    except Exception:
+        logger.exception('Warm pool refill failed')
+    finally:
+        _refill_lock.release()
+
+
+def schedule_refill():
+    """Start a background refill if the pool is enabled, the process is idle and none is running."""
+    from .admission import is_idle
+
+    if not settings.WARM_POOL_ENABLED or _refill_lock.locked():
+        return
+    if not is_idle(settings.WARM_POOL_IDLE_SECONDS):
+        logger.debug('Skipping warm pool refill: requests are active')
+        return
+    threading.Thread(target=refill, name='warm-pool', daemon=True).start()
+
+
+def pool_stats():
+    """Per-design pool size and hit rate, plus totals."""
+    pool = get_pool_collection()
+    designs = []
+    hits = misses = 0
+    for doc in get_pool_designs_collection().find().sort('last_used', -1):
+        doc_hits, doc_misses = doc.get('hits', 0), doc.get('misses', 0)
+        hits += doc_hits
+        misses += doc_misses
+        designs.append({
+            'design_hash': doc['design_hash'],
+            'encoding':    doc['encoding'],
+            'pooled':      pool.count_documents({'design_hash': doc['design_hash'], 'encoding': doc['encoding']}),
+            'hits':        doc_hits,
+            'misses':      doc_misses,
+            'hit_rate':    round(doc_hits / (doc_hits + doc_misses), 3) if doc_hits + doc_misses else None,
+            'last_used':   doc['last_used'].isoformat(),
+        })
+    return {
+        'enabled':  settings.WARM_POOL_ENABLED,
+        'hits':     hits,
+        'misses':   misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        'designs':  designs,
+    }